@@ -4,7 +4,6 @@ import httpx
 import time
 import json
 from aiogram.types import Message
-from openai import AsyncOpenAI
 
 import api_gateway.utils
 
@@ -15,14 +14,19 @@ import microservices.assistant_tasks.scheduler.utils as schd_utils
 import microservices.assistant_tasks.telegram.utils as tg_utils
 
 # Импорт отправки сообщения в голосе
-from functions.ftt_utils import speak_text_gtts_and_send
+from functions.tts_queue import speak_in_background
 
 # Импорт настроек
-from functions.config import set, thread, assistant
+from functions.config import set
 
-client_openai = AsyncOpenAI(
-    api_key=set.openai_api_key
-)
+# Общий клиент OpenAI
+import functions.llm_client as llm_client
+
+# Потоковая отправка ответа ассистента
+from api_gateway.streaming import stream_reply
+
+# Озвучивание ответа по предложениям
+from functions.tts_pipeline import SentenceSpeaker
 
 # router = APIRouter()
 
@@ -57,6 +61,8 @@ async def handle_user_message(message: str, user_id: int, tg_message: Message):
         primary_category = classification_result.get("primary_category")
         secondary_category = classification_result.get("secondary_category")
         details = classification_result.get("details")
+        # Аргументы обработчика, если они уже извлечены при маршрутизации
+        arguments = classification_result.get("arguments")
         
         print(primary_category)
 
@@ -73,7 +79,7 @@ async def handle_user_message(message: str, user_id: int, tg_message: Message):
 
                 - Проверяем корректно ли указание, для добавления задачи
                 """
-                x = await schd_utils.process_user_task(user_id=user_id, message_text=message, tg_message=tg_message)
+                x = await schd_utils.process_user_task(user_id=user_id, message_text=message, tg_message=tg_message, task_details=arguments)
                 print(x)
             except ValueError as ve:
                 return {"status": "error", "details": f"Ошибка обработки задачи: {str(ve)}"}
@@ -92,7 +98,7 @@ async def handle_user_message(message: str, user_id: int, tg_message: Message):
                 - Проверяем корректно ли указание, для взаимодействия с телеграм
                 - Отправляем и удаляем сообщение в чатах, читаем сообщения в чатах и группах
                 """
-                x = await tg_utils.process_tg_manager(user_id=user_id, message_text=message, tg_message=tg_message)
+                x = await tg_utils.process_tg_manager(user_id=user_id, message_text=message, tg_message=tg_message, task_details=arguments)
                 print(x)
             except ValueError as ve:
                 return {"status": "error", "details": f"Ошибка обработки Telegram команды: {str(ve)}"}
@@ -130,26 +136,49 @@ async def handle_user_message(message: str, user_id: int, tg_message: Message):
                 Сейчас Ержан Садыков нуждается в помощи по следующему вопросу: {message}. Как ты будешь ему помогать?
             """
 
-            # Отправка запроса к api
-            completion = await client_openai.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": "You are a personal assistant."},
-                    {"role": "user", "content": prompt}
-                ],
-            )
-            print(completion)
-
-            # Обрабатываем результат
-            # assistants_response = json.loads(completion.choices[0].message.tool_calls[0].function.arguments)
-            assistants_response = completion.choices[0].message.content
-            
-            text = assistants_response
-            await tg_message.answer(text=text)
+            messages = [
+                {"role": "system", "content": "You are a personal assistant."},
+                {"role": "user", "content": prompt}
+            ]
+
+            # Ответ озвучивается по предложениям во время генерации
+            speaker = SentenceSpeaker(chat_id=user_id) if set.assistant_streaming and set.tts_sentence_pipeline else None
+
+            try:
+                if set.assistant_streaming:
+                    # Потоковый ответ: пользователь видит текст с первого токена
+                    text = await stream_reply(
+                        tg_message=tg_message,
+                        chunks=llm_client.stream_chat_completion(model=llm_client.ASSISTANT_MODEL, messages=messages),
+                        on_text=speaker.feed if speaker is not None else None,
+                    )
+                else:
+                    # Отправка запроса к api
+                    completion = await llm_client.create_chat_completion(
+                        model=llm_client.ASSISTANT_MODEL,
+                        messages=messages,
+                    )
+                    print(completion)
+
+                    # Обрабатываем результат
+                    # assistants_response = json.loads(completion.choices[0].message.tool_calls[0].function.arguments)
+                    assistants_response = completion.choices[0].message.content
+
+                    text = assistants_response
+                    await tg_message.answer(text=text)
+            except BaseException:
+                # При ошибке генерации или отправки ответа прерываем незавершённое озвучивание
+                if speaker is not None:
+                    await speaker.aclose()
+                raise
             
             # Конец замера времени
             start_time_ttf = time.time()
-            await speak_text_gtts_and_send(chat_id=user_id, text=text)
+            # Озвучивание завершается в фоне: обработчик возвращается сразу после отправки текста
+            if speaker is not None:
+                speaker.finish_in_background()
+            else:
+                speak_in_background(chat_id=user_id, text=text)
             end_time_ttf = time.time()
 
             
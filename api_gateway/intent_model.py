@@ -0,0 +1,159 @@
+import json
+import os
+import sys
+
+import numpy as np
+
+from functions.config import set
+
+
+class IntentClassifier:
+    """
+    Локальный классификатор намерений: ближайший центроид по эмбеддингам предложений.
+
+    Индекс хранится на диске в виде двух компактных файлов:
+        - vectors.npy: нормализованные эмбеддинги размеченных сообщений (float16);
+        - labels.npy: метки этих сообщений (строковый массив фиксированной длины).
+
+    Для каждой метки при загрузке считается центроид. Решение принимается только среди
+    переданных меток-кандидатов, и только если отрыв лучшей метки от второй не меньше порога.
+    """
+
+    def __init__(self, vectors: np.ndarray, labels: np.ndarray, encoder):
+        """
+        Args:
+            vectors (np.ndarray): Нормализованные эмбеддинги обучающих сообщений, форма (N, D).
+            labels (np.ndarray): Метки обучающих сообщений, форма (N,).
+            encoder: Модель эмбеддингов с методом encode (sentence-transformers).
+        """
+        self.encoder = encoder
+        self.labels = [str(label) for label in np.unique(labels)]
+        self._label_index = {label: i for i, label in enumerate(self.labels)}
+
+        # Центроиды меток, нормализованные для косинусного сходства
+        vectors = vectors.astype(np.float32)
+        centroids = np.stack([vectors[labels == label].mean(axis=0) for label in self.labels])
+        self.centroids = centroids / np.linalg.norm(centroids, axis=1, keepdims=True)
+
+    @classmethod
+    def load(cls, index_dir: str, encoder) -> "IntentClassifier":
+        """
+        Загружает индекс из каталога index_dir.
+        """
+        vectors = np.load(os.path.join(index_dir, "vectors.npy"))
+        labels = np.load(os.path.join(index_dir, "labels.npy"))
+        return cls(vectors=vectors, labels=labels, encoder=encoder)
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        """
+        Вычисляет нормализованные эмбеддинги текстов на CPU.
+        """
+        return np.asarray(
+            self.encoder.encode(texts, normalize_embeddings=True, convert_to_numpy=True),
+            dtype=np.float32,
+        )
+
+    def predict(self, text: str, candidate_labels: list[str]) -> tuple[str | None, float]:
+        """
+        Определяет метку текста среди кандидатов.
+
+        Args:
+            text (str): Текст для классификации.
+            candidate_labels (list): Список меток-кандидатов.
+
+        Returns:
+            tuple: (метка, отрыв от второй метки). Метка равна None, если для какого-то
+                кандидата нет обучающих данных.
+        """
+        if not candidate_labels or any(label not in self._label_index for label in candidate_labels):
+            return None, 0.0
+
+        indices = [self._label_index[label] for label in candidate_labels]
+        similarities = self.centroids[indices] @ self.embed([text])[0]
+
+        order = np.argsort(similarities)[::-1]
+        best = float(similarities[order[0]])
+        second = float(similarities[order[1]]) if len(order) > 1 else -1.0
+        return candidate_labels[int(order[0])], best - second
+
+
+def load_encoder(model_name: str):
+    """
+    Загружает модель эмбеддингов из локального кэша (без обращения к сети).
+    """
+    from sentence_transformers import SentenceTransformer
+
+    return SentenceTransformer(model_name, device="cpu", local_files_only=True)
+
+
+# Экземпляр классификатора, загружаемый при старте приложения
+intent_classifier: IntentClassifier | None = None
+
+
+def load_intent_classifier() -> IntentClassifier | None:
+    """
+    Загружает локальный классификатор намерений, если он включён в настройках.
+
+    Returns:
+        IntentClassifier | None: Классификатор или None, если он выключен или недоступен.
+    """
+    global intent_classifier
+
+    if not set.intent_model_enabled:
+        return None
+    try:
+        intent_classifier = IntentClassifier.load(set.intent_index_dir, load_encoder(set.intent_embedding_model))
+        print(f"Локальный классификатор намерений загружен: {len(intent_classifier.labels)} меток")
+    except ImportError as e:
+        print(f"Для локального классификатора намерений нужен пакет sentence-transformers: {e}")
+    except (OSError, ValueError) as e:
+        print(f"Не удалось загрузить индекс классификатора намерений из {set.intent_index_dir}: {e}")
+    return intent_classifier
+
+
+def log_labelled_message(text: str, candidate_labels: list[str], label: str):
+    """
+    Дописывает размеченное сообщение в журнал трафика, из которого обучается индекс.
+    """
+    if not set.intent_log_path:
+        return
+    try:
+        with open(set.intent_log_path, "a", encoding="utf-8") as log_file:
+            log_file.write(json.dumps({"text": text, "labels": candidate_labels, "label": label}, ensure_ascii=False) + "\n")
+    except OSError as e:
+        print(f"Ошибка записи журнала классификации: {e}")
+
+
+def train_index(log_path: str, index_dir: str, batch_size: int = 64):
+    """
+    Строит индекс классификатора из журнала размеченного трафика.
+
+    Args:
+        log_path (str): Путь к JSONL журналу ({"text": ..., "labels": [...], "label": ...}).
+        index_dir (str): Каталог для сохранения vectors.npy и labels.npy.
+        batch_size (int): Размер пакета при вычислении эмбеддингов.
+    """
+    texts, labels = [], []
+    with open(log_path, encoding="utf-8") as log_file:
+        for line in log_file:
+            record = json.loads(line)
+            # Ответы модели вне набора меток - шум, в обучение не берём
+            if record["label"] in record["labels"]:
+                texts.append(record["text"])
+                labels.append(record["label"])
+
+    if not texts:
+        raise ValueError(f"В журнале {log_path} нет размеченных сообщений.")
+
+    encoder = load_encoder(set.intent_embedding_model)
+    vectors = encoder.encode(texts, batch_size=batch_size, normalize_embeddings=True, convert_to_numpy=True)
+
+    os.makedirs(index_dir, exist_ok=True)
+    np.save(os.path.join(index_dir, "vectors.npy"), np.asarray(vectors, dtype=np.float16))
+    np.save(os.path.join(index_dir, "labels.npy"), np.asarray(labels, dtype=str))
+    print(f"Индекс сохранён в {index_dir}: {len(texts)} сообщений, {len(np.unique(labels))} меток")
+
+
+# python -m api_gateway.intent_model <журнал.jsonl> [каталог индекса]
+if __name__ == "__main__":
+    train_index(log_path=sys.argv[1], index_dir=sys.argv[2] if len(sys.argv) > 2 else set.intent_index_dir)
@@ -0,0 +1,76 @@
+import asyncio
+import time
+
+from aiogram.types import Message
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+
+from functions.config import set
+
+# Максимальная длина текста одного сообщения Telegram
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+
+async def stream_reply(tg_message: Message, chunks, on_text=None) -> str:
+    """
+    Показывает ответ ассистента по мере генерации, редактируя одно сообщение Telegram.
+
+    Первое сообщение отправляется с первым фрагментом текста, дальше оно редактируется
+    не чаще, чем раз в set.stream_edit_interval секунд (ограничения Bot API на редактирование).
+    Если текст не помещается в одно сообщение, продолжение отправляется новым сообщением.
+
+    Args:
+        tg_message (Message): Сообщение пользователя, на которое отвечает ассистент.
+        chunks: Асинхронный итератор фрагментов текста (llm_client.stream_chat_completion).
+        on_text: Необязательная функция, которой передаётся каждый фрагмент текста
+            (например, для озвучивания по предложениям).
+
+    Returns:
+        str: Полный текст ответа.
+    """
+    full_text = ""
+    # Текст, который ещё не отправлен в текущее сообщение, и само текущее сообщение
+    current_text = ""
+    shown_text = ""
+    sent_message = None
+    next_edit_at = 0.0
+
+    async def flush(force: bool = False):
+        nonlocal sent_message, shown_text, next_edit_at
+        if not current_text.strip() or current_text == shown_text:
+            return
+        if not force and time.monotonic() < next_edit_at:
+            return
+        try:
+            # Частичный текст может содержать незакрытую разметку, поэтому parse_mode отключён
+            if sent_message is None:
+                sent_message = await tg_message.answer(text=current_text, parse_mode=None)
+            else:
+                await sent_message.edit_text(text=current_text, parse_mode=None)
+            shown_text = current_text
+            next_edit_at = time.monotonic() + set.stream_edit_interval
+        except TelegramRetryAfter as e:
+            # Превышен лимит Bot API - откладываем следующее редактирование
+            next_edit_at = time.monotonic() + e.retry_after
+            if force:
+                await asyncio.sleep(e.retry_after)
+                await flush(force=True)
+        except TelegramBadRequest as e:
+            # "message is not modified" и подобные ошибки не мешают продолжать поток
+            print(f"Ошибка при обновлении сообщения ассистента: {e}")
+
+    async for chunk in chunks:
+        full_text += chunk
+        if on_text is not None:
+            on_text(chunk)
+
+        # Текущее сообщение заполнено - фиксируем его и начинаем новое
+        if len(current_text) + len(chunk) > TELEGRAM_MESSAGE_LIMIT:
+            await flush(force=True)
+            sent_message = None
+            current_text = shown_text = ""
+        current_text += chunk
+
+        await flush()
+
+    await flush(force=True)
+    return full_text
@@ -1,84 +1,480 @@
-from openai import AsyncOpenAI
 import json
+import asyncio
+import hashlib
+import re
+from dataclasses import dataclass, asdict
+from datetime import datetime
 
 from aiogram.types import Message
 
 # Импорт инструментов для работы с Redis
 from functions.redis_client import set_user_state, get_user_state
+from functions.cache import TwoTierCache
+
+# Локальный классификатор намерений
+import api_gateway.intent_model as intent_model
 
 # Параметры настроек
 from functions.config import set
 
 # Импорт отправки сообщения в голосе
-from functions.ftt_utils import speak_text_gtts_and_send
+from functions.tts_queue import speak_in_background
+
+# Схемы аргументов обработчиков для совмещённой маршрутизации
+import microservices.assistant_tasks.scheduler.utils as schd_utils
+import microservices.assistant_tasks.telegram.classification as tg_classification
+import microservices.assistant_tasks.telegram.utils as tg_utils
+
+# Общий клиент OpenAI
+import functions.llm_client as llm_client
+from functions.rate_limiter import Priority
 
-# Инициализация клиента OpenAI
-client = AsyncOpenAI(
-    api_key=set.openai_api_key
+# Кэш результатов классификации: LRU в памяти процесса перед Redis
+classification_cache = TwoTierCache(
+    namespace="classify",
+    max_size=set.classification_cache_size,
+    ttl=set.classification_cache_ttl,
 )
 
-async def classify_text_async(sequence_to_classify: str, candidate_labels: list[str]) -> str:
+
+# Инструмент функции классификации (неизменная часть запроса)
+CLASSIFY_TOOLS = [
+    {
+        "type": "function",
+        "function": {
+            "name": "classify_text",
+            "description": "Classify the input text into predefined categories.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "category": {
+                        "type": "string",
+                        "description": "The category the input text belongs to.",
+                    }
+                },
+                "required": ["category"],
+                "additionalProperties": False,
+            },
+        }
+    }
+]
+
+
+# Инструкция классификатора; метки и текст передаются следующими сообщениями
+CLASSIFY_INSTRUCTIONS = (
+    "You are a text classifier. Classify the text from the last user message into exactly one "
+    "of the categories listed in the previous user message. "
+    "Respond with the category that best describes the text, exactly as it is written in the list."
+)
+
+# Версия промпта классификации: входит в ключ кэша, при изменении промпта или инструментов её нужно увеличить
+CLASSIFY_PROMPT_VERSION = 2
+
+
+def normalize_classification_text(text: str) -> str:
+    """
+    Нормализует текст для ключа кэша: регистр, "ё", пробелы и пунктуация по краям.
+    """
+    text = text.lower().replace("ё", "е")
+    text = " ".join(text.split())
+    return re.sub(r"^[\W_]+|[\W_]+$", "", text)
+
+
+def classification_cache_key(sequence_to_classify: str, candidate_labels: list[str]) -> str:
+    """
+    Ключ кэша классификации: модель, версия промпта, нормализованный текст и набор меток
+    (порядок меток не важен). После смены модели или промпта старые ответы не используются.
+    """
+    raw = (
+        f"{llm_client.CLASSIFIER_MODEL}\0{CLASSIFY_PROMPT_VERSION}\0"
+        + normalize_classification_text(sequence_to_classify) + "\x1f" + "\x1e".join(sorted(candidate_labels))
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+async def classify_text_async(sequence_to_classify: str, candidate_labels: list[str], priority: Priority = Priority.INTERACTIVE) -> str:
     """
     Асинхронно классифицирует текст в одну из заданных категорий с использованием OpenAI.
 
     Args:
         sequence_to_classify (str): Текст для классификации.
         candidate_labels (list): Список категорий для классификации.
-        client: Асинхронный экземпляр OpenAI клиента.
+        priority (Priority): Полоса приоритета запроса к OpenAI.
 
     Returns:
         str: Категория, к которой относится текст, или сообщение об ошибке.
     """
-    # Определение инструмента для функции классификации
-    tools = [
-        {
-            "type": "function",
-            "function": {
-                "name": "classify_text",
-                "description": "Classify the input text into predefined categories.",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "category": {
-                            "type": "string",
-                            "description": "The category the input text belongs to.",
-                        }
-                    },
-                    "required": ["category"],
-                    "additionalProperties": False,
-                },
-            }
-        }
-    ]
+    category, _ = await _classify_text(sequence_to_classify, candidate_labels, priority)
+    return category
 
-    # Формируем промпт для модели
-    prompt = (
-        f"Classify the following text: '{sequence_to_classify}' into one of the following categories: "
-        f"{', '.join(candidate_labels)}. "
-        "Respond with the category that best describes the text."
-    )
+
+async def _classify_text(sequence_to_classify: str, candidate_labels: list[str], priority: Priority) -> tuple[str, bool]:
+    """
+    Классифицирует текст (см. classify_text_async) и сообщает, получена ли категория из кэша.
+
+    Returns:
+        tuple: Категория (или сообщение об ошибке) и True, если она взята из кэша.
+    """
+    # Повторяющиеся фразы возвращаются из кэша без обращения к OpenAI
+    cache_key = classification_cache_key(sequence_to_classify, candidate_labels)
+    cached_category = await classification_cache.get(cache_key)
+    if cached_category is not None:
+        return cached_category, True
+
+    # Инструкция и метки образуют постоянный префикс запроса, текст добавляется в конце
+    labels_prompt = "Categories:\n" + "\n".join(f"- {label}" for label in candidate_labels)
 
     try:
-        model = "gpt-3.5-turbo"
-        # model="gpt-4o-mini"
-        
         # Создаём асинхронный запрос к OpenAI
-        completion = await client.chat.completions.create(
-            model=model,
+        completion = await llm_client.create_chat_completion(
+            call_name="classify_text_async",
+            priority=priority,
+            model=llm_client.CLASSIFIER_MODEL,
             messages=[
-                {"role": "system", "content": "You are a text classifier."},
-                {"role": "user", "content": prompt}
+                {"role": "system", "content": CLASSIFY_INSTRUCTIONS},
+                {"role": "user", "content": labels_prompt},
+                {"role": "user", "content": f"Text to classify: {sequence_to_classify}"}
             ],
-            tools=tools,
+            tools=CLASSIFY_TOOLS,
         )
 
         # Получаем категорию из результатов вызова функции
         category = str(json.loads(completion.choices[0].message.tool_calls[0].function.arguments)["category"])
-        return category
+
+        # Кэшируем только корректные метки, чтобы не закреплять ошибки модели
+        if category in candidate_labels:
+            await classification_cache.set(cache_key, category)
+        return category, False
     except (KeyError, ValueError, TypeError) as e:
-        return f"Ошибка при анализе результата: {e}"
+        return f"Ошибка при анализе результата: {e}", False
     except Exception as e:
-        return f"Общая ошибка: {e}"
+        return f"Общая ошибка: {e}", False
+
+
+@dataclass
+class RoutingResult:
+    """
+    Результат совмещённой маршрутизации: категория сообщения и аргументы обработчика.
+
+    Attributes:
+        primary_category (str): Первичная категория сообщения.
+        secondary_category (str): Вторичная категория (менеджер) или "None".
+        details (str): Описание результата классификации.
+        arguments (dict | None): Аргументы в формате, который принимает обработчик категории
+            (task_details для process_user_task или process_tg_manager).
+    """
+    primary_category: str
+    secondary_category: str
+    details: str
+    arguments: dict | None = None
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+# Метки первичной классификации
+PRIMARY_LABELS = ["Функции управления умным домом", "Функции личного ассистента", "Другое"]
+
+# Метки вторичной классификации (менеджеры личного ассистента)
+SECONDARY_LABELS = [
+    "Менеджер напоминаний и планирования",
+    "Менеджер мессенджера Telegram",
+    "Менеджер видеозвонков",
+    "Менеджер скриншотов",
+    "Менеджер переводов"
+]
+
+# Метки ответа на вопрос "Зачитать ли сообщение?"
+READ_ALOUD_LABELS = ["Зачитать сообщение", "Не зачитывать сообщение", "Прочее"]
+
+# Менеджеры личного ассистента, для которых ещё нет обработчиков
+UNSUPPORTED_MANAGERS = ["Менеджер видеозвонков", "Менеджер скриншотов", "Менеджер переводов"]
+
+
+async def route_label(user_message: str, candidate_labels: list[str]) -> str:
+    """
+    Классифицирует сообщение по фиксированному набору меток шлюза.
+
+    Сначала используется локальный классификатор намерений; к OpenAI (classify_text_async)
+    обращаемся только если он не загружен или отрыв лучшей метки меньше set.intent_min_margin.
+    Свежие ответы OpenAI (не из кэша классификации) записываются в журнал для последующего
+    обучения локального индекса, чтобы повторяющиеся фразы не накапливались в нём дублями.
+
+    Args:
+        user_message (str): Текст для классификации.
+        candidate_labels (list): Фиксированный набор меток.
+
+    Returns:
+        str: Категория, к которой относится текст, или сообщение об ошибке.
+    """
+    classifier = intent_model.intent_classifier
+    if classifier is not None:
+        try:
+            label, margin = await asyncio.to_thread(classifier.predict, user_message, candidate_labels)
+            if label is not None and margin >= set.intent_min_margin:
+                return label
+        except Exception as e:
+            print(f"Ошибка локального классификатора намерений: {e}")
+
+    label, from_cache = await _classify_text(user_message, candidate_labels, Priority.INTERACTIVE)
+    if label in candidate_labels and not from_cache:
+        await asyncio.to_thread(intent_model.log_labelled_message, user_message, candidate_labels, label)
+    return label
+
+
+# Инструменты совмещённой маршрутизации: каждый инструмент соответствует одной категории.
+# Схемы аргументов берутся у обработчиков категорий
+ROUTING_TOOLS = [
+    {
+        "type": "function",
+        "function": {
+            "name": "schedule_task",
+            "description": "Reminder and scheduling manager: the user wants to create a reminder or schedule a task.",
+            "parameters": schd_utils.TASK_DETAILS_PARAMETERS,
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "telegram_message_action",
+            "description": "Telegram messenger manager: the user wants to send, read or delete messages in Telegram chats.",
+            "parameters": tg_classification.MESSAGE_ACTION_PARAMETERS,
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "other_assistant_manager",
+            "description": "Other personal assistant managers: video calls, screenshots or translations.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "manager": {
+                        "type": "string",
+                        "enum": UNSUPPORTED_MANAGERS,
+                        "description": "The manager the request belongs to.",
+                    }
+                },
+                "required": ["manager"],
+                "additionalProperties": False,
+            },
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "smart_home",
+            "description": "Smart home control functions.",
+            "parameters": {"type": "object", "properties": {}, "additionalProperties": False},
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "general_conversation",
+            "description": "Anything else: questions, small talk and requests not covered by the other tools.",
+            "parameters": {"type": "object", "properties": {}, "additionalProperties": False},
+        }
+    },
+]
+
+ROUTING_INSTRUCTIONS = """
+    You are a request router of a personal assistant.
+    Route the request from the last user message to exactly one tool and fill in its arguments,
+    using the current datetime given there.
+    Use schedule_task for reminders and scheduling, telegram_message_action for Telegram messaging,
+    and general_conversation when no other tool fits.
+"""
+
+
+def fast_route(user_message: str, current_datetime: datetime | None = None) -> RoutingResult | None:
+    """
+    Быстрый путь маршрутизации без обращения к OpenAI для частых шаблонных команд.
+
+    Напоминания разбирает schd_utils.parse_reminder, команды Telegram - tg_utils.parse_command.
+    Результат используется, только если уверенность разбора не ниже set.fast_path_min_confidence.
+
+    Args:
+        user_message (str): Сообщение пользователя.
+        current_datetime (datetime | None): Текущая дата и время для разбора сроков задач.
+
+    Returns:
+        RoutingResult | None: Категория и аргументы обработчика или None, если нужен LLM.
+    """
+    if current_datetime is None:
+        current_datetime = datetime.now()
+
+    reminder = schd_utils.parse_reminder(user_message, current_datetime)
+    if reminder and reminder["confidence"] >= set.fast_path_min_confidence:
+        return RoutingResult(
+            primary_category="Функции личного ассистента",
+            secondary_category="Менеджер напоминаний и планирования",
+            details=f"Быстрый разбор напоминания (уверенность {reminder['confidence']:.2f})",
+            arguments=reminder["task_details"],
+        )
+
+    command = tg_utils.parse_command(user_message)
+    if command["action"] != "unknown" and command["confidence"] >= set.fast_path_min_confidence:
+        return RoutingResult(
+            primary_category="Функции личного ассистента",
+            secondary_category="Менеджер мессенджера Telegram",
+            details=f"Быстрый разбор команды {command['action']} (уверенность {command['confidence']:.2f})",
+            arguments=tg_utils.command_to_task_details(command),
+        )
+
+    return None
+
+
+async def route_and_extract(user_message: str, current_datetime: datetime | None = None) -> RoutingResult:
+    """
+    Определяет категорию сообщения и извлекает аргументы обработчика одним запросом к OpenAI.
+
+    Заменяет цепочку "первичная классификация -> вторичная классификация -> извлечение параметров".
+
+    Args:
+        user_message (str): Сообщение пользователя.
+        current_datetime (datetime | None): Текущая дата и время для разбора сроков задач.
+
+    Returns:
+        RoutingResult: Категории и аргументы для обработчика.
+    """
+    if current_datetime is None:
+        current_datetime = datetime.now()
+
+    try:
+        completion = await llm_client.create_chat_completion(
+            call_name="route_and_extract",
+            model=llm_client.EXTRACTOR_MODEL,
+            messages=[
+                {"role": "system", "content": ROUTING_INSTRUCTIONS},
+                {"role": "user", "content": f"Current datetime is: {current_datetime.isoformat()}.\nRequest: {user_message}"}
+            ],
+            tools=ROUTING_TOOLS,
+            tool_choice="required",
+        )
+
+        tool_call = completion.choices[0].message.tool_calls[0]
+        name = tool_call.function.name
+        arguments = json.loads(tool_call.function.arguments or "{}")
+    except (KeyError, ValueError, TypeError, IndexError) as e:
+        return RoutingResult("Неопределено", "None", f"Ошибка при анализе результата: {e}")
+    except Exception as e:
+        return RoutingResult("Неопределено", "None", f"Общая ошибка: {e}")
+
+    if name == "schedule_task":
+        return RoutingResult(
+            primary_category="Функции личного ассистента",
+            secondary_category="Менеджер напоминаний и планирования",
+            details="Сообщение классифицировано как: Менеджер напоминаний и планирования",
+            arguments=schd_utils.parse_task_details(arguments, current_datetime),
+        )
+    if name == "telegram_message_action":
+        return RoutingResult(
+            primary_category="Функции личного ассистента",
+            secondary_category="Менеджер мессенджера Telegram",
+            details="Сообщение классифицировано как: Менеджер мессенджера Telegram",
+            arguments=tg_classification.parse_message_action(arguments),
+        )
+    if name == "other_assistant_manager":
+        manager = str(arguments.get("manager", "Неопределено"))
+        return RoutingResult("Функции личного ассистента", manager, f"Сообщение классифицировано как: {manager}")
+    if name == "smart_home":
+        return RoutingResult("Функции управления умным домом", "None", "Функция умного дома пока не реализована.")
+
+    return RoutingResult("Прочий мусор", "None", "Cообщение не относится к поддерживаемым категориям.")
+
+
+# Экстракторы аргументов обработчиков по вторичной категории
+EXTRACTORS = {
+    "Менеджер напоминаний и планирования": schd_utils.classify_and_extract_task_details,
+    "Менеджер мессенджера Telegram": tg_classification.classify_and_filter_message_action,
+}
+
+
+async def speculative_route(user_message: str, current_datetime: datetime | None = None) -> RoutingResult:
+    """
+    Спекулятивная маршрутизация: первичная и вторичная классификация и извлечение аргументов
+    обработчиков запускаются одновременно.
+
+    Как только классификация подтверждает метку, результат нужного экстрактора сохраняется,
+    а остальные запросы отменяются. Время ответа равно максимуму, а не сумме длительностей запросов.
+    Число спекулятивных извлечений ограничено настройками speculation_categories и speculation_max_extractions.
+
+    Args:
+        user_message (str): Сообщение пользователя.
+        current_datetime (datetime | None): Текущая дата и время для разбора сроков задач.
+
+    Returns:
+        RoutingResult: Категории и (если удалось) аргументы для обработчика.
+    """
+    if current_datetime is None:
+        current_datetime = datetime.now()
+
+    primary_task = asyncio.create_task(
+        route_label(user_message=user_message, candidate_labels=PRIMARY_LABELS)
+    )
+    secondary_task = asyncio.create_task(
+        route_label(user_message=user_message, candidate_labels=SECONDARY_LABELS)
+    )
+
+    # Запускаем экстракторы только для разрешённых категорий и в пределах лимита
+    speculative_categories = [
+        category for category in set.speculation_categories if category in EXTRACTORS
+    ][:max(set.speculation_max_extractions, 0)]
+    extraction_tasks = {
+        category: asyncio.create_task(
+            EXTRACTORS[category](current_datetime=current_datetime, message_text=user_message)
+        )
+        for category in speculative_categories
+    }
+
+    def cancel_extractions(keep: str | None = None):
+        for category, task in extraction_tasks.items():
+            if category != keep:
+                task.cancel()
+
+    try:
+        pending = {primary_task, secondary_task}
+        while primary_task in pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            # Вторичная метка пришла раньше первичной: лишние экстракторы можно отменить сразу
+            if secondary_task in done:
+                cancel_extractions(keep=secondary_task.result())
+
+        primary_classification = primary_task.result()
+        print(f"\nprimary_classification = {primary_classification}\n")
+
+        if primary_classification != "Функции личного ассистента":
+            secondary_task.cancel()
+            cancel_extractions()
+            if primary_classification == "Функции управления умным домом":
+                return RoutingResult("Функции управления умным домом", "None", "Функция умного дома пока не реализована.")
+            if primary_classification == "Другое":
+                return RoutingResult("Прочий мусор", "None", "Cообщение не относится к поддерживаемым категориям.")
+            return RoutingResult("Неопределено", "None", "Не удалось классифицировать сообщение.")
+
+        secondary_classification = await secondary_task
+        print(f"\nsecondary_classification = {secondary_classification}\n")
+        cancel_extractions(keep=secondary_classification)
+
+        arguments = None
+        if secondary_classification in extraction_tasks:
+            arguments = await extraction_tasks[secondary_classification]
+            # Экстрактор вернул строку с ошибкой - обработчик повторит извлечение сам
+            if not isinstance(arguments, dict):
+                arguments = None
+
+        return RoutingResult(
+            primary_category="Функции личного ассистента",
+            secondary_category=secondary_classification,
+            details=f"Сообщение классифицировано как: {secondary_classification}",
+            arguments=arguments,
+        )
+    finally:
+        # Отменяем всё, что осталось незавершённым (в том числе при отмене самой маршрутизации)
+        for task in [primary_task, secondary_task, *extraction_tasks.values()]:
+            if not task.done():
+                task.cancel()
 
 
 # Класификация сообщений
@@ -108,11 +504,29 @@ async def process_user_message(user_message: str,  tg_message: Message):
             Контекст обычного входящего сообщения
             Нет дополнительных контекстов
         """
+
+        # Быстрый путь: шаблонные команды разбираются без обращения к OpenAI
+        if set.fast_path_enabled:
+            routing_result = fast_route(user_message=user_message)
+            if routing_result is not None:
+                print(f"\nfast_route = {routing_result}\n")
+                return routing_result.to_dict()
+
+        # Совмещённая маршрутизация: категория и аргументы обработчика за один запрос
+        if set.routing_mode == "fused":
+            routing_result = await route_and_extract(user_message=user_message)
+            print(f"\nrouting_result = {routing_result}\n")
+            return routing_result.to_dict()
+
+        # Спекулятивная маршрутизация: классификация и извлечение аргументов выполняются параллельно
+        if set.routing_mode == "speculative":
+            routing_result = await speculative_route(user_message=user_message)
+            return routing_result.to_dict()
         
         # Первая классификация
-        primary_labels = ["Функции управления умным домом", "Функции личного ассистента", "Другое"]
+        primary_labels = PRIMARY_LABELS
         # primary_labels = ["Функции управления умным домом", "Функции личного ассистента"]
-        primary_classification = await classify_text_async(sequence_to_classify=user_message, candidate_labels=primary_labels)
+        primary_classification = await route_label(user_message=user_message, candidate_labels=primary_labels)
         print(f"\nprimary_classification = {primary_classification}\n")
 
         # Проверяем результат первой классификации
@@ -132,15 +546,9 @@ async def process_user_message(user_message: str,  tg_message: Message):
 
         # Если категория "Функции личного ассистента", проводим вторичную классификацию
         if primary_classification == "Функции личного ассистента":
-            secondary_labels = [
-                "Менеджер напоминаний и планирования",
-                "Менеджер мессенджера Telegram",
-                "Менеджер видеозвонков",
-                "Менеджер скриншотов",
-                "Менеджер переводов"
-            ]
+            secondary_labels = SECONDARY_LABELS
             
-            secondary_classification = await classify_text_async(sequence_to_classify=user_message, candidate_labels=secondary_labels)
+            secondary_classification = await route_label(user_message=user_message, candidate_labels=secondary_labels)
             print(f"\nsecondary_classification = {secondary_classification}\n")
 
             # secondary_category = secondary_classification.get("category", "Неопределено")
@@ -166,9 +574,9 @@ async def process_user_message(user_message: str,  tg_message: Message):
 
             # Класификация ответа
             # primary_labels = ["Да, зачитать сообщение, которое пришло", "Нет, не зачитывать сообщение, которое пришло", "Прочее"]
-            primary_labels = ["Зачитать сообщение", "Не зачитывать сообщение", "Прочее"]
+            primary_labels = READ_ALOUD_LABELS
 
-            primary_classification = await classify_text_async(sequence_to_classify=user_message, candidate_labels=primary_labels)
+            primary_classification = await route_label(user_message=user_message, candidate_labels=primary_labels)
             
             print(f"primary_classification = {primary_classification}")  # Вывод классификации для отладки
 
@@ -176,20 +584,20 @@ async def process_user_message(user_message: str,  tg_message: Message):
             if primary_classification == "Зачитать сообщение":
                 text = f"Вам написали следующее сообщение: {income_message_text}"
                 await tg_message.answer(text=text)
-                await speak_text_gtts_and_send(chat_id=user_id, text=text)
+                speak_in_background(chat_id=user_id, text=text)
                 return {"category": "Прочий мусор", "details": "Сообщение не относится к поддерживаемым категориям."}
             
             elif primary_classification == "Не зачитывать сообщение":
                 text = "Хорошо. Сообщение не будет озвучено. С чем вам помочь еще?"
                 await tg_message.answer(text=text)
-                await speak_text_gtts_and_send(chat_id=user_id, text=text)
+                speak_in_background(chat_id=user_id, text=text)
                 return {"category": "Прочий мусор", "details": "Сообщение не относится к поддерживаемым категориям."}
             
             else:
                 # Обработка случая, когда классификация не совпала с ожидаемыми метками
                 text = "Извините, не могу понять ваш ответ."
                 await tg_message.answer(text=text)
-                await speak_text_gtts_and_send(chat_id=user_id, text=text)
+                speak_in_background(chat_id=user_id, text=text)
                 return {"category": "Неопределено", "details": "Ответ не распознан."}
 
         except Exception as e:
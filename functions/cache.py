@@ -0,0 +1,116 @@
+import time
+from collections import OrderedDict
+
+import redis.asyncio as redis
+
+from functions.redis_client import redis_client
+
+
+class TwoTierCache:
+    """
+    Двухуровневый кэш строковых значений: LRU в памяти процесса перед Redis.
+
+    Локальный уровень отвечает за микросекундные попадания и ограничен по размеру,
+    Redis хранит значения между перезапусками и общий для всех процессов.
+    Оба уровня имеют TTL. Ошибки Redis не прерывают работу - кэш просто считается пустым.
+    """
+
+    def __init__(self, namespace: str, max_size: int = 1024, ttl: int = 3600, local_ttl: int | None = None):
+        """
+        Args:
+            namespace (str): Префикс ключей в Redis.
+            max_size (int): Максимальное число записей в локальном LRU.
+            ttl (int): Время жизни записи в Redis, в секундах.
+            local_ttl (int | None): Время жизни записи в локальном LRU (по умолчанию равно ttl).
+        """
+        self.namespace = namespace
+        self.max_size = max_size
+        self.ttl = ttl
+        self.local_ttl = ttl if local_ttl is None else local_ttl
+        self._local: OrderedDict[str, tuple[float, str]] = OrderedDict()
+
+        # Счётчики попаданий и промахов
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _redis_key(self, key: str) -> str:
+        return f"cache:{self.namespace}:{key}"
+
+    def _get_local(self, key: str) -> str | None:
+        entry = self._local.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._local[key]
+            return None
+        self._local.move_to_end(key)
+        return value
+
+    def _set_local(self, key: str, value: str):
+        self._local[key] = (time.monotonic() + self.local_ttl, value)
+        self._local.move_to_end(key)
+        while len(self._local) > self.max_size:
+            self._local.popitem(last=False)
+            self.evictions += 1
+
+    async def get(self, key: str) -> str | None:
+        """
+        Возвращает значение по ключу из локального LRU или Redis.
+
+        Args:
+            key (str): Ключ записи.
+
+        Returns:
+            str | None: Значение или None при промахе.
+        """
+        value = self._get_local(key)
+        if value is not None:
+            self.local_hits += 1
+            return value
+
+        try:
+            value = await redis_client.get(self._redis_key(key))
+        except redis.exceptions.RedisError as e:
+            print(f"Ошибка чтения кэша {self.namespace} из Redis: {e}")
+            value = None
+
+        if value is None:
+            self.misses += 1
+            return None
+
+        self.redis_hits += 1
+        self._set_local(key, value)
+        return value
+
+    async def set(self, key: str, value: str):
+        """
+        Сохраняет значение в оба уровня кэша.
+
+        Args:
+            key (str): Ключ записи.
+            value (str): Значение.
+        """
+        self._set_local(key, value)
+        try:
+            await redis_client.set(self._redis_key(key), value, ex=self.ttl)
+        except redis.exceptions.RedisError as e:
+            print(f"Ошибка записи кэша {self.namespace} в Redis: {e}")
+
+    def stats(self) -> dict:
+        """
+        Возвращает счётчики попаданий и промахов кэша.
+        """
+        hits = self.local_hits + self.redis_hits
+        total = hits + self.misses
+        return {
+            "namespace": self.namespace,
+            "size": len(self._local),
+            "local_hits": self.local_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": hits / total if total else 0.0,
+        }
@@ -1,7 +1,5 @@
 from pydantic_settings import BaseSettings
 
-from openai import OpenAI
-
 import platform
 import struct
 import ctypes
@@ -13,8 +11,6 @@ from aiogram.fsm.storage.memory import MemoryStorage
 
 from telethon import TelegramClient, events
 
-from openai import OpenAI
-
 ############################################################
 
 # Переменные окружения
@@ -26,6 +22,162 @@ class Settings(BaseSettings):
     api_id_th: int
     api_hash_th: str
 
+    # Режим маршрутизации сообщений в api_gateway:
+    # "sequential" - первичная и вторичная классификация, затем извлечение параметров обработчиком;
+    # "fused" - категория и параметры обработчика извлекаются одним tool-calling запросом;
+    # "speculative" - классификация и извлечение параметров запускаются параллельно
+    routing_mode: str = "sequential"
+
+    # Категории, для которых в режиме "speculative" заранее запускается извлечение параметров,
+    # и максимальное число таких спекулятивных запросов на одно сообщение
+    speculation_categories: list[str] = ["Менеджер напоминаний и планирования", "Менеджер мессенджера Telegram"]
+    speculation_max_extractions: int = 2
+
+    # Быстрый разбор шаблонных команд без обращения к OpenAI и минимальная уверенность разбора
+    fast_path_enabled: bool = True
+    fast_path_min_confidence: float = 0.85
+
+    # Кэш результатов классификации: размер LRU в памяти и TTL записей (секунды)
+    classification_cache_size: int = 4096
+    classification_cache_ttl: int = 7 * 24 * 3600
+
+    # Локальный классификатор намерений (ближайший центроид по эмбеддингам) перед OpenAI:
+    # каталог индекса (vectors.npy, labels.npy), модель эмбеддингов из локального кэша,
+    # минимальный отрыв лучшей метки и журнал размеченного трафика для обучения ("" - не вести)
+    intent_model_enabled: bool = False
+    intent_index_dir: str = "intent_index"
+    intent_embedding_model: str = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+    intent_min_margin: float = 0.08
+    intent_log_path: str = ""
+
+    # Общий клиент OpenAI (functions/llm_client.py): модели, пул соединений, сроки и повторы
+    openai_classifier_model: str = "gpt-3.5-turbo"
+    openai_extractor_model: str = "gpt-4o-mini"
+    openai_assistant_model: str = "gpt-4o"
+    openai_stt_model: str = "whisper-1"
+    openai_tts_model: str = "tts-1"
+    openai_max_connections: int = 100
+    openai_max_keepalive_connections: int = 20
+    openai_keepalive_expiry: float = 60.0
+    openai_connect_timeout: float = 5.0
+    openai_deadline: float = 30.0
+    openai_max_retries: int = 3
+    openai_retry_base_delay: float = 0.5
+    openai_retry_max_delay: float = 8.0
+
+    # Максимальное ожидание допуска в очереди ограничителя запросов (секунды) - отдельно
+    # от срока выполнения запроса, который отсчитывается после получения допуска
+    openai_admission_timeout: float = 30.0
+
+    # Лимиты OpenAI для контроллера допуска запросов (functions/rate_limiter.py)
+    openai_chat_rpm: int = 500
+    openai_chat_tpm: int = 200000
+    openai_transcription_rpm: int = 50
+    openai_speech_rpm: int = 50
+    openai_expected_completion_tokens: int = 256
+
+    # Потоковый ответ ассистента с постепенным редактированием сообщения Telegram
+    # и минимальный интервал между редактированиями (секунды)
+    assistant_streaming: bool = False
+    stream_edit_interval: float = 1.0
+
+    # Озвучивание потокового ответа по предложениям: включение, число одновременных
+    # запросов синтеза и минимальная длина фрагмента после первого предложения
+    tts_sentence_pipeline: bool = True
+    tts_pipeline_workers: int = 3
+    tts_pipeline_min_chars: int = 80
+
+    # Загрузка голосовых сообщений из Telegram: размер пула соединений и общий таймаут (секунды)
+    telegram_download_connections: int = 20
+    telegram_download_timeout: float = 30.0
+
+    # Движок распознавания речи: "api" - Whisper API, "local" - локальная модель Whisper
+    # в пуле процессов (functions/local_stt.py): модель, число процессов, квантование int8
+    # и язык распознавания ("" - определять автоматически)
+    stt_engine: str = "api"
+    local_stt_model: str = "base"
+    local_stt_workers: int = 2
+    local_stt_int8: bool = False
+    local_stt_language: str = "ru"
+
+    # Пакетное распознавание одновременных коротких голосовых сообщений локальной моделью:
+    # время сбора пакета (секунды) и максимальный размер пакета (1 - без пакетов)
+    local_stt_batch_window: float = 0.05
+    local_stt_max_batch: int = 8
+
+    # Удаление тишины перед распознаванием речи (энергетический VAD): длина кадра (мс),
+    # превышение уровня шума (дБ), минимальный уровень речи (дБ), удержание после речи (мс)
+    # и максимальная длина сохраняемой паузы (мс)
+    vad_enabled: bool = True
+    vad_frame_ms: int = 30
+    vad_margin_db: float = 10.0
+    vad_min_db: float = -50.0
+    vad_hangover_ms: int = 300
+    vad_max_pause_ms: int = 400
+
+    # Минимальная доля удалённой тишины, при которой в Whisper API отправляется обрезанная запись:
+    # она уходит в WAV, который примерно в 10 раз больше Opus, поэтому при меньшей экономии
+    # длительности отправляется исходный OGG
+    vad_min_saving: float = 0.2
+
+    # Параллельное распознавание длинных голосовых сообщений по фрагментам: порог длительности,
+    # максимальная длина фрагмента и перекрытие соседних фрагментов (секунды), число одновременных запросов
+    stt_chunking_enabled: bool = True
+    stt_chunk_threshold_seconds: float = 60.0
+    stt_chunk_max_seconds: float = 30.0
+    stt_chunk_overlap_seconds: float = 0.5
+    stt_chunk_concurrency: int = 4
+
+    # Кэш транскрипций голосовых сообщений по file_unique_id (и, если включено, по SHA-256 аудио):
+    # размер LRU в памяти и TTL записей (секунды)
+    transcription_cache_enabled: bool = True
+    transcription_cache_by_content: bool = True
+    transcription_cache_size: int = 1024
+    transcription_cache_ttl: int = 30 * 24 * 3600
+
+    # Хеджирование Whisper API локальной моделью: локальная модель запускается, если API
+    # не ответил за заданный перцентиль своего времени ответа (пока измерений меньше
+    # stt_hedge_min_samples - за stt_hedge_delay секунд); размер окна измерений
+    stt_hedging: bool = False
+    stt_hedge_percentile: float = 0.95
+    stt_hedge_delay: float = 3.0
+    stt_hedge_min_samples: int = 20
+    stt_latency_window: int = 200
+
+    # Кэш озвученных фраз (file_id голосовых сообщений Telegram): размер LRU в памяти, TTL (секунды),
+    # максимальная длина кэшируемого текста и служебный чат для озвучивания фраз при запуске (None - не озвучивать)
+    tts_cache_enabled: bool = True
+    tts_cache_size: int = 2048
+    tts_cache_ttl: int = 30 * 24 * 3600
+    tts_cache_max_chars: int = 300
+    tts_prewarm_chat_id: int | None = None
+
+    # Фоновая очередь озвучивания ответов: число исполнителей, длина очереди исполнителя
+    # и максимальное время ожидания задания (секунды), после которого оно отбрасывается
+    tts_queue_workers: int = 4
+    tts_queue_max_depth: int = 50
+    tts_queue_max_age: float = 30.0
+
+    # Озвучивание длинного текста по фрагментам: максимальная длина фрагмента
+    # (лимит tts-1 - 4096 символов) и число одновременных запросов синтеза
+    tts_chunk_max_chars: int = 1000
+    tts_chunk_concurrency: int = 4
+
+    # Голосовые напоминания планировщика и окно (минуты), за которое они озвучиваются заранее
+    reminder_voice: bool = True
+    reminder_prerender_minutes: int = 10
+
+    # Размер пакета задач, выполняемых планировщиком в одной транзакции
+    scheduler_batch_size: int = 100
+
+    # Число одновременно отправляемых напоминаний (Bot API допускает около 30 сообщений в секунду,
+    # напоминание - это текст и голосовое сообщение) и число повторов отправки после TelegramRetryAfter
+    reminder_send_concurrency: int = 10
+    reminder_send_retries: int = 3
+
+    # Окно (минуты), на которое таймер планировщика загружает ближайшие задачи из базы
+    scheduler_lookahead_minutes: int = 10
+
     class Config:
         env_file = 'D:\\Programming\\Python\\GPT\\Voice_assistant_based_on_neural\\.env'
 
@@ -64,32 +216,3 @@ telegram_client = TelegramClient('voice_assistant', set.api_id_th, set.api_hash_
 #     Vokaturi = ctypes.CDLL("D:\\Programming\\OpenVokaturi-4-0\\lib\\open\\linux\\OpenVokaturi-4-0-linux.so")
     
 # print("Library Loaded: %s" % Vokaturi.versionAndLicense())
-
-############################################################
-
-# Инициализация OpenAI ассистента
-
-# Инициализация клиента OpenAI
-openai_client = OpenAI(
-    api_key=set.openai_api_key
-)
-
-# Инструкция
-instructions = """
-
-    You are a professional literary Arabic language tutor. Communicate on various topics in literary Arabic. When answering, use next list of words: {my_words}. Use present, past and future tenses. Your answer must include an answer in Arabic and then a translation of the your current answer from Arabic into !!!Russian!!!.
-
-"""
-
-# Выбор модели 
-model = "gpt-4o"
-
-# Создание ассистента
-assistant = openai_client.beta.assistants.create(
-    name="Arabic language tutor",
-    instructions=instructions,
-    model=model,
-)
-
-# Создание потока  
-thread = openai_client.beta.threads.create()
@@ -1,5 +1,3 @@
-import whisper
-
 import aiohttp
 import asyncio
 
@@ -8,41 +6,65 @@ import numpy as np
 
 import logging
 import os
-import tempfile
+import time
+from collections import deque
+from pathlib import Path
 
 from gtts import gTTS
 
-from openai import AsyncOpenAI
-
 from aiogram.types import InputFile
 from aiogram.types import FSInputFile
+from aiogram.types import BufferedInputFile
 
 import io
+import re
+import hashlib
 from io import BytesIO
 
 from functions.config import set, bot_tg
 
-# Инициализация клиента OpenAI
-client_openai = AsyncOpenAI(
-    api_key=set.openai_api_key
-)
+# Общий клиент OpenAI
+import functions.llm_client as llm_client
+import functions.local_stt as local_stt
+import functions.ogg as ogg
+from functions.rate_limiter import Priority
+from functions.cache import TwoTierCache
 
 TOKEN = set.telegram_bot_token
 
-async def convert_ogg_to_mp3_bytes(audio_data_bytes_io):
+# Кэш транскрипций: ключ - file_unique_id голосового сообщения Telegram
+# (одинаков у пересланных и повторно отправленных сообщений) или SHA-256 аудио
+transcription_cache = TwoTierCache(
+    namespace="transcription",
+    max_size=set.transcription_cache_size,
+    ttl=set.transcription_cache_ttl,
+)
+
+
+async def get_cached_transcription(file_unique_id: str) -> str | None:
+    """
+    Возвращает сохранённую транскрипцию голосового сообщения по его file_unique_id.
+    """
+    if not set.transcription_cache_enabled or not file_unique_id:
+        return None
+    return await transcription_cache.get(f"file:{file_unique_id}")
+
+async def convert_ogg_to_wav_bytes(audio_data_bytes_io):
     """
-    Асинхронно преобразует аудиофайл из BytesIO (формат OGG) в MP3, возвращает результат в BytesIO.
+    Асинхронно преобразует аудиофайл из BytesIO (формат OGG) в WAV 16 кГц, возвращает результат в BytesIO.
+
+    Для распознавания речи используется decode_voice.
 
     :param audio_data_bytes_io: BytesIO объект с аудио в формате OGG.
-    :return: BytesIO объект с MP3 содержимым.
+    :return: BytesIO объект с WAV содержимым.
     """
     try:
         # Проверка, что входной BytesIO объект не пустой
         if not audio_data_bytes_io or not isinstance(audio_data_bytes_io, io.BytesIO):
             raise ValueError("Передан пустой или некорректный BytesIO объект.")
 
-        # Создаем BytesIO для хранения MP3
-        mp3_output = io.BytesIO()
+        # Создаем BytesIO для хранения WAV
+        wav_output = io.BytesIO()
 
         # Команда для вызова ffmpeg
         command = [
@@ -67,14 +89,42 @@ async def convert_ogg_to_mp3_bytes(audio_data_bytes_io):
         if process.returncode != 0:
             raise RuntimeError(f"Ошибка ffmpeg: {stderr.decode('utf-8')}")
 
-        mp3_output.write(stdout)
-        mp3_output.seek(0)  # Сброс указателя в начало
-        return mp3_output
+        wav_output.write(stdout)
+        wav_output.seek(0)  # Сброс указателя в начало
+        return wav_output
     except ValueError as e:
         raise ValueError(f"Ошибка: {str(e)}")
     except Exception as e:
         raise RuntimeError(f"Непредвиденная ошибка при конвертации аудио: {str(e)}")
     
+async def decode_with_ffmpeg(audio_bytes: bytes, sample_rate: int = local_stt.SAMPLE_RATE) -> np.ndarray:
+    """
+    Декодирует аудио через ffmpeg сразу в моно float32 (сырые отсчёты f32le, без WAV).
+
+    :param audio_bytes: Аудиофайл в любом формате, поддерживаемом ffmpeg.
+    :param sample_rate: Частота дискретизации результата.
+    :return: NumPy массив моно аудио float32.
+    """
+    command = [
+        "ffmpeg", "-i", "pipe:0",
+        "-vn",
+        "-ar", str(sample_rate),
+        "-ac", "1",
+        "-f", "f32le",
+        "pipe:1"
+    ]
+    process = await asyncio.create_subprocess_exec(
+        *command,
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE
+    )
+    stdout, stderr = await process.communicate(input=audio_bytes)
+
+    if process.returncode != 0:
+        raise RuntimeError(f"Ошибка ffmpeg: {stderr.decode('utf-8')}")
+    return np.frombuffer(stdout, dtype=np.float32)
+
 async def bytesio_to_numpy(audio_bytesio):
     """
     Конвертирует аудиоданные из BytesIO в массив NumPy.
@@ -96,6 +146,86 @@ async def bytesio_to_numpy(audio_bytesio):
 
 
 
+def trim_silence(audio: np.ndarray, sample_rate: int) -> np.ndarray:
+    """
+    Удаляет тишину в начале и в конце записи и сокращает длинные паузы (энергетический VAD).
+
+    Запись делится на кадры по set.vad_frame_ms, для каждого кадра считается энергия в дБ.
+    Кадр считается речью, если его энергия выше уровня шума (10-й процентиль) на set.vad_margin_db,
+    но не ниже set.vad_min_db. Речевые кадры расширяются на set.vad_hangover_ms в обе стороны,
+    чтобы не обрезать начала и окончания слов; паузы между речью сокращаются до set.vad_max_pause_ms.
+
+    :param audio: NumPy массив моно аудио float32.
+    :param sample_rate: Частота дискретизации.
+    :return: NumPy массив без тишины (исходный массив, если речь не найдена).
+    """
+    frame_len = max(1, int(sample_rate * set.vad_frame_ms / 1000))
+    n_frames = len(audio) // frame_len
+    if n_frames == 0:
+        return audio
+
+    # Энергия кадров в дБ относительно полной шкалы
+    frames = audio[:n_frames * frame_len].reshape(n_frames, frame_len)
+    energy_db = 10 * np.log10(np.mean(frames ** 2, axis=1) + 1e-10)
+    threshold = max(np.percentile(energy_db, 10) + set.vad_margin_db, set.vad_min_db)
+    speech = energy_db > threshold
+    if not speech.any():
+        return audio
+
+    # Удержание: расширяем речевые кадры в обе стороны
+    hangover = int(set.vad_hangover_ms / set.vad_frame_ms)
+    if hangover > 0:
+        speech = np.convolve(speech, np.ones(2 * hangover + 1), mode="same") > 0
+
+    # Номер кадра внутри паузы: сколько кадров прошло после последнего речевого кадра
+    index = np.arange(n_frames)
+    last_speech = np.maximum.accumulate(np.where(speech, index, -1))
+    pause_position = index - last_speech - 1
+
+    # Оставляем речь и начало пауз между речью; тишину в начале и в конце записи убираем
+    max_pause = int(set.vad_max_pause_ms / set.vad_frame_ms)
+    keep = speech | ((last_speech >= 0) & (pause_position < max_pause))
+    keep &= index <= index[speech][-1]
+
+    # Хвост записи короче кадра следует за последним кадром
+    keep_samples = np.repeat(keep, frame_len)
+    keep_samples = np.concatenate([keep_samples, np.full(len(audio) - len(keep_samples), keep[-1])])
+    return audio[keep_samples]
+
+
+def numpy_to_wav_bytes(audio: np.ndarray, sample_rate: int) -> bytes:
+    """
+    Кодирует аудио в WAV (16 бит) в памяти для отправки в Whisper API.
+    """
+    wav_output = io.BytesIO()
+    sf.write(wav_output, audio, sample_rate, format="WAV", subtype="PCM_16")
+    return wav_output.getvalue()
+
+
+async def decode_voice(audio_bytes: bytes, trim: bool = True) -> tuple[np.ndarray, int]:
+    """
+    Декодирует голосовое сообщение в массив NumPy и, если включено, удаляет из него тишину.
+
+    :param audio_bytes: Голосовое сообщение в формате OGG.
+    :param trim: Удалять тишину (при set.vad_enabled).
+    :return: NumPy массив с аудиоданными и частота дискретизации.
+    """
+    audio_data = None
+    # Opus декодируется в процессе, ffmpeg - только запасной вариант. Декодирование длинных
+    # записей занимает сотни миллисекунд, поэтому выполняется в потоке, а не в цикле событий
+    if ogg.opus_available():
+        try:
+            audio_data = await asyncio.to_thread(ogg.decode_opus, audio_bytes, sample_rate=local_stt.SAMPLE_RATE)
+        except ValueError as e:
+            logging.error(f"Ошибка декодирования Opus, используется ffmpeg: {e}")
+    if audio_data is None:
+        audio_data = await decode_with_ffmpeg(audio_bytes)
+
+    if trim and set.vad_enabled:
+        audio_data = trim_silence(audio_data, local_stt.SAMPLE_RATE)
+    return audio_data, local_stt.SAMPLE_RATE
+
+
 # Использование whisper в виде развернутой локальной модели
 # async def process_voice_message(file_path: str):
 #     """
@@ -127,7 +257,7 @@ async def bytesio_to_numpy(audio_bytesio):
         
 #         try:
 #             # Step 1: Convert OGG to MP3 in memory
-#             mp3_audio = await convert_ogg_to_mp3_bytes(audio_data_bytes_io=audio_data_bytes_io)
+#             mp3_audio = await convert_ogg_to_wav_bytes(audio_data_bytes_io=audio_data_bytes_io)
 #             if not mp3_audio:
 #                 raise ValueError("Конвертация аудио завершилась неудачей.")
 
@@ -154,54 +284,393 @@ async def bytesio_to_numpy(audio_bytesio):
 #             return f"Ошибка обработки аудиофайла: {str(e)}"
 
 
-# Транскрибация через whisper api
-async def process_voice_message(file_path: str):
+# Общая сессия aiohttp для загрузки файлов из Telegram (создаётся при первом обращении)
+_http_session: aiohttp.ClientSession | None = None
+
+
+def get_http_session() -> aiohttp.ClientSession:
+    """
+    Возвращает общую сессию aiohttp с пулом keep-alive соединений к api.telegram.org.
+    """
+    global _http_session
+    if _http_session is None or _http_session.closed:
+        _http_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=set.telegram_download_connections, keepalive_timeout=60),
+            timeout=aiohttp.ClientTimeout(total=set.telegram_download_timeout),
+        )
+    return _http_session
+
+
+async def close_http_session():
+    """
+    Закрывает общую сессию aiohttp при остановке приложения.
+    """
+    if _http_session is not None and not _http_session.closed:
+        await _http_session.close()
+
+
+async def download_telegram_file(file_path: str) -> bytes:
+    """
+    Загружает файл с серверов Telegram в память через общую сессию.
+
+    Args:
+        file_path (str): Путь к файлу на сервере Telegram.
+
+    Returns:
+        bytes: Содержимое файла.
+    """
+    file_url = f"https://api.telegram.org/file/bot{TOKEN}/{file_path}"
+    async with get_http_session().get(file_url) as response:
+        if response.status != 200:
+            raise RuntimeError(f"Не удалось загрузить файл с сервера Telegram (HTTP {response.status})")
+        return await response.read()
+
+
+async def transcribe_api_clip(audio: np.ndarray, sample_rate: int) -> str:
+    """
+    Транскрипция фрагмента аудио через Whisper API (фрагмент отправляется как WAV в памяти).
+    """
+    transcription = await llm_client.create_transcription(file=("voice.wav", numpy_to_wav_bytes(audio, sample_rate)))
+    return transcription.text
+
+
+def split_at_pauses(audio: np.ndarray, sample_rate: int, max_seconds: float, overlap_seconds: float) -> list[np.ndarray]:
+    """
+    Делит запись на фрагменты не длиннее max_seconds, разрезая её в самых тихих местах.
+
+    Место разреза ищется во второй половине каждого фрагмента по минимальной энергии кадра
+    (обычно это пауза между словами). Соседние фрагменты перекрываются на overlap_seconds,
+    чтобы слово на границе не потерялось; повтор убирается при склейке текста.
+
+    :param audio: NumPy массив моно аудио float32.
+    :param sample_rate: Частота дискретизации.
+    :param max_seconds: Максимальная длина фрагмента, в секундах.
+    :param overlap_seconds: Перекрытие соседних фрагментов, в секундах.
+    :return: Список фрагментов по порядку.
+    """
+    frame_len = max(1, int(sample_rate * set.vad_frame_ms / 1000))
+    n_frames = len(audio) // frame_len
+    energy = np.mean(audio[:n_frames * frame_len].reshape(n_frames, frame_len) ** 2, axis=1)
+
+    max_len = int(max_seconds * sample_rate)
+    overlap = int(overlap_seconds * sample_rate)
+    chunks = []
+    start = 0
+    while len(audio) - start > max_len:
+        # Самый тихий кадр во второй половине окна [start, start + max_len)
+        first_frame = (start + max_len // 2) // frame_len
+        last_frame = min((start + max_len) // frame_len, n_frames)
+        cut = (first_frame + int(np.argmin(energy[first_frame:last_frame]))) * frame_len + frame_len // 2
+        chunks.append(audio[start:cut])
+        start = max(cut - overlap, start + 1)
+    chunks.append(audio[start:])
+    return chunks
+
+
+def _normalize_word(word: str) -> str:
+    return word.strip(".,!?…:;\"'«»()-").lower()
+
+
+def stitch_transcripts(texts: list[str], max_overlap_words: int = 8) -> str:
+    """
+    Склеивает тексты соседних фрагментов, убирая слова, повторённые из-за перекрытия.
+
+    Ищется самое длинное (не больше max_overlap_words слов) совпадение конца накопленного текста
+    с началом следующего фрагмента без учёта регистра и знаков препинания.
+    """
+    words: list[str] = []
+    for text in texts:
+        new_words = text.split()
+        overlap = 0
+        for size in range(min(len(words), len(new_words), max_overlap_words), 0, -1):
+            tail = [_normalize_word(word) for word in words[-size:]]
+            head = [_normalize_word(word) for word in new_words[:size]]
+            if tail == head:
+                overlap = size
+                break
+        words.extend(new_words[overlap:])
+    return " ".join(words)
+
+
+async def transcribe_in_chunks(audio: np.ndarray, sample_rate: int, transcribe) -> str:
+    """
+    Параллельная транскрипция длинной записи по фрагментам.
+
+    Запись делится в паузах на фрагменты не длиннее set.stt_chunk_max_seconds, фрагменты
+    распознаются одновременно (не больше set.stt_chunk_concurrency запросов), а тексты
+    склеиваются по порядку.
+
+    Args:
+        audio (np.ndarray): Моно аудио float32.
+        sample_rate (int): Частота дискретизации.
+        transcribe: Корутинная функция (аудио, частота) -> текст для одного фрагмента.
+
+    Returns:
+        str: Распознанный текст всей записи.
+    """
+    chunks = split_at_pauses(audio, sample_rate, set.stt_chunk_max_seconds, set.stt_chunk_overlap_seconds)
+    semaphore = asyncio.Semaphore(set.stt_chunk_concurrency)
+
+    async def transcribe_chunk(chunk: np.ndarray) -> str:
+        async with semaphore:
+            return await transcribe(chunk, sample_rate)
+
+    texts = await asyncio.gather(*(transcribe_chunk(chunk) for chunk in chunks))
+    return stitch_transcripts(texts)
+
+
+def is_long_voice(audio: np.ndarray, sample_rate: int) -> bool:
+    """
+    Проверяет, нужно ли распознавать запись по фрагментам.
+    """
+    return set.stt_chunking_enabled and len(audio) > set.stt_chunk_threshold_seconds * sample_rate
+
+
+class LatencyTracker:
+    """
+    Скользящее окно времени ответа движка распознавания речи для оценки перцентилей.
+    """
+
+    def __init__(self, name: str, window: int):
+        """
+        Args:
+            name (str): Имя движка (для статистики).
+            window (int): Число последних измерений в окне.
+        """
+        self.name = name
+        self.samples: deque[float] = deque(maxlen=window)
+
+    def record(self, seconds: float):
+        self.samples.append(seconds)
+
+    def percentile(self, q: float) -> float | None:
+        """
+        Перцентиль времени ответа (q от 0 до 1) или None, если измерений пока мало.
+        """
+        if len(self.samples) < set.stt_hedge_min_samples:
+            return None
+        return float(np.quantile(np.fromiter(self.samples, dtype=np.float64), q))
+
+    async def measure(self, coroutine):
+        """
+        Выполняет корутину и учитывает время её выполнения.
+
+        Отменённый (проигравший гонку) или прерванный по таймауту вызов учитывается с прошедшим
+        временем как нижней оценкой: иначе самые медленные ответы выпадали бы из окна
+        и перцентиль смещался бы вниз.
+        """
+        started_at = time.monotonic()
+        try:
+            result = await coroutine
+        except (asyncio.CancelledError, TimeoutError):
+            self.record(time.monotonic() - started_at)
+            raise
+        self.record(time.monotonic() - started_at)
+        return result
+
+    def stats(self) -> dict:
+        return {
+            "name": self.name,
+            "samples": len(self.samples),
+            "p50": self.percentile(0.5),
+            "p95": self.percentile(0.95),
+        }
+
+
+# Время ответа Whisper API и локальной модели
+api_stt_latency = LatencyTracker("api", window=set.stt_latency_window)
+local_stt_latency = LatencyTracker("local", window=set.stt_latency_window)
+
+
+def stt_latency_stats() -> list[dict]:
+    """
+    Перцентили времени ответа движков распознавания речи.
+    """
+    return [api_stt_latency.stats(), local_stt_latency.stats()]
+
+
+async def transcribe_locally(audio_bytes: bytes, decoded: tuple[np.ndarray, int] | None = None) -> str:
+    """
+    Транскрипция голосового сообщения локальной моделью Whisper.
+
+    Args:
+        audio_bytes (bytes): Голосовое сообщение в формате OGG.
+        decoded (tuple | None): Уже декодированная запись без удаления тишины (decode_voice(..., trim=False)).
+
+    Returns:
+        str: Распознанный текст.
+    """
+    if decoded is None:
+        audio_data, sample_rate = await decode_voice(audio_bytes)
+    else:
+        audio_data, sample_rate = decoded
+        if set.vad_enabled:
+            audio_data = trim_silence(audio_data, sample_rate)
+    if is_long_voice(audio_data, sample_rate):
+        return await transcribe_in_chunks(
+            audio_data, sample_rate, lambda chunk, rate: local_stt.engine.transcribe(chunk, sample_rate=rate)
+        )
+    return await local_stt.engine.transcribe(audio_data, sample_rate=sample_rate)
+
+
+async def transcribe_with_api(
+    audio_bytes: bytes,
+    duration: int | None = None,
+    decoded: tuple[np.ndarray, int] | None = None,
+) -> str:
+    """
+    Транскрипция голосового сообщения через Whisper API.
+
+    Если включён VAD и он удалил не меньше set.vad_min_saving записи, отправляется запись без тишины
+    (Whisper API тарифицируется по длительности). Длинные записи распознаются по фрагментам параллельно.
+    В остальных случаях, а также если декодирование не удалось, отправляется исходный OGG.
+
+    Args:
+        audio_bytes (bytes): Голосовое сообщение в формате OGG.
+        duration (int | None): Длительность сообщения по данным Telegram, в секундах.
+        decoded (tuple | None): Уже декодированная запись без удаления тишины (decode_voice(..., trim=False)).
+
+    Returns:
+        str: Распознанный текст.
+    """
+    may_be_long = set.stt_chunking_enabled and (duration is None or duration > set.stt_chunk_threshold_seconds)
+    if decoded is None and (set.vad_enabled or may_be_long):
+        try:
+            decoded = await decode_voice(audio_bytes, trim=False)
+        except Exception as e:
+            logging.error(f"Ошибка декодирования голосового сообщения, отправляется исходная запись: {e}")
+    if decoded is not None:
+        audio_data, sample_rate = decoded
+        trimmed = trim_silence(audio_data, sample_rate) if set.vad_enabled else audio_data
+        if is_long_voice(trimmed, sample_rate):
+            return await transcribe_in_chunks(trimmed, sample_rate, transcribe_api_clip)
+        # Небольшая экономия длительности не окупает отправку WAV вместо Opus
+        if len(trimmed) <= len(audio_data) * (1 - set.vad_min_saving):
+            return await transcribe_api_clip(trimmed, sample_rate)
+
+    transcription = await llm_client.create_transcription(file=("voice.ogg", audio_bytes))
+    return transcription.text
+
+
+async def cache_transcription(cache_keys: list[str], text: str):
+    """
+    Сохраняет транскрипцию в кэш под всеми ключами (пустой текст не сохраняется).
+    """
+    if not set.transcription_cache_enabled or not text.strip():
+        return
+    await asyncio.gather(*(transcription_cache.set(key, text) for key in cache_keys))
+
+
+async def transcribe_hedged(audio_bytes: bytes, duration: int | None = None) -> str:
+    """
+    Хеджированная транскрипция: Whisper API с подстраховкой локальной моделью.
+
+    Сначала запускается запрос к Whisper API. Если он не ответил за set.stt_hedge_percentile
+    перцентиль своего обычного времени ответа (пока измерений мало - за set.stt_hedge_delay секунд)
+    или завершился ошибкой, параллельно запускается локальная модель. Используется первый
+    успешный результат, второй запрос отменяется. Запись декодируется один раз для обоих движков.
+
+    Args:
+        audio_bytes (bytes): Голосовое сообщение в формате OGG.
+        duration (int | None): Длительность сообщения по данным Telegram, в секундах.
+
+    Returns:
+        str: Распознанный текст.
+    """
+    try:
+        decoded = await decode_voice(audio_bytes, trim=False)
+    except Exception as e:
+        logging.error(f"Ошибка декодирования голосового сообщения, отправляется исходная запись: {e}")
+        decoded = None
+
+    api_task = asyncio.create_task(
+        api_stt_latency.measure(transcribe_with_api(audio_bytes, duration=duration, decoded=decoded))
+    )
+    hedge_delay = api_stt_latency.percentile(set.stt_hedge_percentile) or set.stt_hedge_delay
+
+    tasks = [api_task]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=hedge_delay)
+        if done and api_task.exception() is None:
+            return api_task.result()
+
+        tasks.append(asyncio.create_task(local_stt_latency.measure(transcribe_locally(audio_bytes, decoded=decoded))))
+        pending = {task for task in tasks if not task.done()}
+        error = api_task.exception() if api_task.done() else None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        # Проигравший (или оставшийся после отмены вызывающего) запрос отменяется
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+
+# Транскрибация через whisper api или локальную модель
+async def process_voice_message(file_path: str, duration: int | None = None, file_unique_id: str | None = None):
     """
     Асинхронная загрузка, обработка и транскрипция голосового сообщения из Telegram.
 
+    Файл не сохраняется на диск: загруженные байты передаются в Whisper API как файл в памяти.
+    Успешные транскрипции сохраняются в кэш по file_unique_id и SHA-256 аудио.
+
     Args:
         file_path (str): Путь к файлу аудио на сервере Telegram.
+        duration (int | None): Длительность сообщения по данным Telegram, в секундах.
+        file_unique_id (str | None): Постоянный идентификатор файла Telegram для кэша транскрипций.
 
     Returns:
         str: Распознанный текст или сообщение об ошибке.
     """
-    # Формирование ссылки на файл
-    file_url = f"https://api.telegram.org/file/bot{TOKEN}/{file_path}"
-
     try:
         # Шаг 1: Асинхронная загрузка голосового сообщения из Telegram
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(file_url) as response:
-                    if response.status != 200:
-                        return "Ошибка: Не удалось загрузить файл с сервера Telegram"
-                    audio_bytes = await response.read()
-                    audio_data_bytes_io = io.BytesIO(audio_bytes)
+            audio_bytes = await download_telegram_file(file_path)
         except aiohttp.ClientError as e:
             return f"Ошибка при загрузке файла: {str(e)}"
         except Exception as e:
             return f"Непредвиденная ошибка при загрузке: {str(e)}"
 
-        # Шаг 2: Сохранение аудиофайла в формате OGG в временное хранилище
-        try:
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.ogg') as temp_ogg_file:
-                temp_ogg_file.write(audio_data_bytes_io.read())
-                temp_ogg_file_path = temp_ogg_file.name  # Путь к временно сохранённому файлу
-
-            # Шаг 3: Транскрипция с использованием Whisper API
-            with open(temp_ogg_file_path, "rb") as audio_file:
-                transcription = await client_openai.audio.transcriptions.create(
-                    model="whisper-1",
-                    file=audio_file
-                )
-
-            # Шаг 4: Удаление временного файла после транскрипции
-            os.remove(temp_ogg_file_path)
-
-            return transcription.text
-        
-        except Exception as e:
-            return f"Ошибка при обработке и транскрипции аудиофайла: {str(e)}"
+        # Тот же звук мог прийти в другом файле - проверяем кэш по содержимому
+        cache_keys = [f"file:{file_unique_id}"] if file_unique_id else []
+        if set.transcription_cache_by_content:
+            content_key = f"sha256:{hashlib.sha256(audio_bytes).hexdigest()}"
+            cache_keys.append(content_key)
+            if set.transcription_cache_enabled:
+                cached_text = await transcription_cache.get(content_key)
+                if cached_text is not None:
+                    await cache_transcription(cache_keys, cached_text)
+                    return cached_text
+
+        # Шаг 2: Whisper API с подстраховкой локальной моделью
+        if local_stt.engine is not None and set.stt_hedging:
+            try:
+                text = await transcribe_hedged(audio_bytes, duration=duration)
+            except Exception as e:
+                return f"Ошибка при обработке и транскрипции аудиофайла: {str(e)}"
+
+        # Шаг 2: Транскрипция локальной моделью, если она запущена
+        elif local_stt.engine is not None:
+            try:
+                text = await transcribe_locally(audio_bytes)
+            except Exception as e:
+                return f"Ошибка при локальной транскрипции аудиофайла: {str(e)}"
+
+        # Шаг 2: Транскрипция с использованием Whisper API
+        else:
+            try:
+                text = await transcribe_with_api(audio_bytes, duration=duration)
+
+            except Exception as e:
+                return f"Ошибка при обработке и транскрипции аудиофайла: {str(e)}"
+
+        await cache_transcription(cache_keys, text)
+        return text
 
     except Exception as e:
         return f"Общая ошибка обработки аудиофайла: {str(e)}"
@@ -241,6 +710,123 @@ async def process_voice_message(file_path: str):
 #     # Отправка голосового сообщения
 #     await send_voice_message(chat_id=chat_id, voice=audio_buffer)
 
+async def synthesize_speech(text: str, voice: str = "alloy", priority: Priority = Priority.INTERACTIVE) -> bytes:
+    """Генерация TTS в памяти в формате Ogg/Opus (формат голосовых сообщений Telegram).
+
+    Args:
+        text (str): Текст для озвучивания.
+        voice (str): Голос OpenAI TTS.
+        priority (Priority): Полоса приоритета запроса к OpenAI.
+
+    Returns:
+        bytes: Аудио в формате Ogg/Opus.
+    """
+    response = await llm_client.create_speech(
+        voice=voice,
+        input=text,
+        response_format="opus",
+        priority=priority,
+    )
+    return response.content
+
+
+# Граница предложения для разбиения длинного текста перед синтезом речи
+_TTS_SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?…])\s+|\n+")
+
+
+def split_text_for_tts(text: str, max_chars: int) -> list[str]:
+    """Разбивает текст на фрагменты не длиннее max_chars по границам предложений.
+
+    Предложения объединяются, пока фрагмент не превысит max_chars; слишком длинное
+    предложение делится по словам.
+
+    Args:
+        text (str): Текст для озвучивания.
+        max_chars (int): Максимальная длина фрагмента.
+
+    Returns:
+        list: Фрагменты текста по порядку.
+    """
+    chunks = []
+    current = ""
+    for sentence in _TTS_SENTENCE_BOUNDARY.split(text.strip()):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        pieces = [sentence]
+        if len(sentence) > max_chars:
+            # Длинное предложение делим по словам (слово длиннее лимита - по символам)
+            pieces, piece = [], ""
+            for word in sentence.split():
+                while len(word) > max_chars:
+                    pieces.extend([piece] if piece else [])
+                    piece = ""
+                    pieces.append(word[:max_chars])
+                    word = word[max_chars:]
+                if piece and len(piece) + 1 + len(word) > max_chars:
+                    pieces.append(piece)
+                    piece = ""
+                piece = f"{piece} {word}".strip()
+            if piece:
+                pieces.append(piece)
+
+        for piece in pieces:
+            if current and len(current) + 1 + len(piece) > max_chars:
+                chunks.append(current)
+                current = ""
+            current = f"{current} {piece}".strip()
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+async def synthesize_long_speech(text: str, voice: str = "alloy", priority: Priority = Priority.INTERACTIVE) -> bytes:
+    """Генерация TTS для текста любой длины.
+
+    Текст длиннее set.tts_chunk_max_chars делится по предложениям, фрагменты озвучиваются
+    параллельно (не больше set.tts_chunk_concurrency запросов), а пакеты Opus склеиваются
+    в одно голосовое сообщение без перекодирования.
+
+    Args:
+        text (str): Текст для озвучивания.
+        voice (str): Голос OpenAI TTS.
+        priority (Priority): Полоса приоритета запроса к OpenAI.
+
+    Returns:
+        bytes: Аудио в формате Ogg/Opus.
+    """
+    chunks = split_text_for_tts(text, set.tts_chunk_max_chars)
+    if len(chunks) <= 1:
+        return await synthesize_speech(text, voice=voice, priority=priority)
+
+    semaphore = asyncio.Semaphore(set.tts_chunk_concurrency)
+
+    async def synthesize_chunk(chunk: str) -> bytes:
+        async with semaphore:
+            return await synthesize_speech(chunk, voice=voice, priority=priority)
+
+    parts = await asyncio.gather(*(synthesize_chunk(chunk) for chunk in chunks))
+    # Пересчёт CRC страниц выполняется на чистом Python - не блокируем цикл событий
+    return await asyncio.to_thread(ogg.concat_opus, parts)
+
+
+async def send_voice_bytes(chat_id: int, voice: bytes, filename: str = "voice.ogg"):
+    """Отправка голосового сообщения из памяти, без временных файлов.
+
+    Args:
+        chat_id (int): чат для отправки
+        voice (bytes): аудио в формате Ogg/Opus
+        filename (str): имя файла для Telegram
+
+    Returns:
+        Message | None: Отправленное сообщение или None при ошибке.
+    """
+    try:
+        return await bot_tg.send_voice(chat_id=chat_id, voice=BufferedInputFile(voice, filename=filename))
+    except Exception as e:
+        logging.error(f"Ошибка при отправке голосового сообщения: {e}")
+        return None
+
 async def send_voice_message(chat_id: int, voice_path: str):
     """Отправка голосового сообщения пользователю.
 
@@ -260,45 +846,136 @@ async def send_voice_message(chat_id: int, voice_path: str):
             os.remove(voice_path)
 
 async def speak_text_and_save(text: str, filename: str):
-    """Генерация TTS и сохранение в MP3 файл.
+    """Генерация TTS и сохранение в файл.
+
+    Синтез выполняется в памяти, запись файла - в отдельном потоке, чтобы не блокировать цикл событий.
 
     Args:
         text (str): Текст для озвучивания.
-        filename (str): Путь к файлу для сохранения MP3.
+        filename (str): Путь к файлу для сохранения (формат Ogg/Opus).
     """
     try:
-        # Генерация TTS
-        # tts = gTTS(text=text, lang='ru', slow=False)
-        
-        from pathlib import Path
-
-        speech_file_path = "voice_message.mp3"
-        response = await client_openai.audio.speech.create(
-            model="tts-1",
-            voice="alloy",
-            input=text
-        )
-
-        response.stream_to_file(speech_file_path)
-        
-        # Сохранение в MP3 файл
-        # response.save(speech_file_path)
+        voice = await synthesize_long_speech(text)
+        await asyncio.to_thread(Path(filename).write_bytes, voice)
         logging.info(f"Голосовое сообщение сохранено в файл {filename}")
     except Exception as e:
         logging.error(f"Ошибка при сохранении голосового сообщения: {e}")
 
+# Кэш озвученных фраз: ключ - хэш (текст, голос, модель), значение - file_id голосового
+# сообщения Telegram, которое можно отправить повторно без синтеза и загрузки
+voice_cache = TwoTierCache(
+    namespace="tts_file_id",
+    max_size=set.tts_cache_size,
+    ttl=set.tts_cache_ttl,
+)
+
+# Неизменные фразы ответов, которые можно озвучить заранее при запуске
+CANNED_VOICE_PHRASES = [
+    "Задача успешно добавлена в планировщик. С чем вам я могу еще помочь?!",
+    "Не удалось извлечь текст задачи из вашего сообщения. Пожалуйста уточните задание!",
+    "Не удалось извлечь время начала выполения задчи из вашего сообщения. Пожалуйста уточните задание!",
+    "Не удалось извлечь текст задачи или время начала выполнения задания из вышего сообщения. Пожалуйста уточните задание!!",
+    "Задание менеджера telegram успешно выполнена. С чем я могу еще помочь?",
+    "Сообщение не отправлено, повторите попытку!",
+    "Сообщение не прочитано, повторите попытку!",
+    "Хорошо. Сообщение не будет озвучено. С чем вам помочь еще?",
+    "Извините, не могу понять ваш ответ.",
+]
+
+
+def voice_cache_key(text: str, voice: str = "alloy") -> str:
+    """
+    Ключ кэша озвученной фразы: SHA-256 от модели TTS, голоса и текста.
+    """
+    return hashlib.sha256(f"{llm_client.TTS_MODEL}\0{voice}\0{text}".encode("utf-8")).hexdigest()
+
+
+async def send_cached_voice(chat_id: int, cache_key: str):
+    """
+    Отправляет ранее загруженное голосовое сообщение по file_id из кэша.
+
+    Returns:
+        Message | None: Отправленное сообщение или None, если в кэше нет записи или отправка не удалась.
+    """
+    file_id = await voice_cache.get(cache_key)
+    if file_id is None:
+        return None
+    try:
+        return await bot_tg.send_voice(chat_id=chat_id, voice=file_id)
+    except Exception as e:
+        logging.error(f"Ошибка при отправке голосового сообщения из кэша: {e}")
+        return None
+
+
+async def remember_voice(cache_key: str, message):
+    """
+    Сохраняет file_id отправленного голосового сообщения в кэш.
+    """
+    if message is not None and message.voice is not None:
+        await voice_cache.set(cache_key, message.voice.file_id)
+
+
+async def prewarm_voice_cache(phrases: list[str] = CANNED_VOICE_PHRASES):
+    """
+    Заранее озвучивает неизменные фразы, загружая их в служебный чат set.tts_prewarm_chat_id.
+
+    Загруженные сообщения удаляются из чата, их file_id остаются в кэше.
+    Фразы, уже имеющиеся в кэше, пропускаются.
+    """
+    if not set.tts_cache_enabled or not set.tts_prewarm_chat_id:
+        return
+
+    warmed = 0
+    for phrase in phrases:
+        cache_key = voice_cache_key(phrase)
+        if await voice_cache.get(cache_key) is not None:
+            continue
+        try:
+            voice = await synthesize_speech(phrase, priority=Priority.BACKGROUND)
+        except Exception as e:
+            logging.error(f"Ошибка при озвучивании фразы для кэша: {e}")
+            continue
+
+        message = await send_voice_bytes(chat_id=set.tts_prewarm_chat_id, voice=voice)
+        await remember_voice(cache_key, message)
+        if message is not None:
+            warmed += 1
+            try:
+                await message.delete()
+            except Exception as e:
+                logging.error(f"Ошибка при удалении служебного голосового сообщения: {e}")
+    print(f"Кэш озвученных фраз: загружено {warmed} из {len(phrases)} фраз")
+
+
 async def speak_text_gtts_and_send(chat_id: int, text: str):
-    """Генерация TTS, сохранение и отправка голосового сообщения.
+    """Генерация TTS в памяти и отправка голосового сообщения.
+
+    Аудио не сохраняется на диск, поэтому одновременные ответы разным пользователям
+    не мешают друг другу. Короткие фразы, уже отправлявшиеся ранее, повторно отправляются
+    по file_id из кэша - без синтеза и загрузки.
 
     Args:
         chat_id (int): Идентификатор чата.
         text (str): Текст для озвучивания.
+
+    Returns:
+        Message | None: Отправленное голосовое сообщение или None при ошибке.
     """
-    # Создание пути для файла
-    voice_file_path = "voice_message.mp3"
-    
-    # Генерация TTS и сохранение в файл
-    await speak_text_and_save(text, voice_file_path)
-    
+    cacheable = set.tts_cache_enabled and len(text) <= set.tts_cache_max_chars
+    if cacheable:
+        cache_key = voice_cache_key(text)
+        message = await send_cached_voice(chat_id=chat_id, cache_key=cache_key)
+        if message is not None:
+            return message
+
+    try:
+        voice = await synthesize_long_speech(text)
+    except Exception as e:
+        logging.error(f"Ошибка при генерации голосового сообщения: {e}")
+        return None
+
     # Отправка голосового сообщения
-    await send_voice_message(chat_id, voice_file_path)
\ No newline at end of file
+    message = await send_voice_bytes(chat_id=chat_id, voice=voice)
+    if cacheable:
+        await remember_voice(cache_key, message)
+    return message
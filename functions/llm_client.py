@@ -0,0 +1,291 @@
+import asyncio
+import json
+import random
+
+import httpx
+from openai import (
+    AsyncOpenAI,
+    APIConnectionError,
+    APITimeoutError,
+    RateLimitError,
+    InternalServerError,
+)
+
+from functions.config import set
+from functions.rate_limiter import RateLimiter, Priority
+
+############################################################
+
+# Модели OpenAI - единственное место, где они выбираются
+
+CLASSIFIER_MODEL = set.openai_classifier_model
+EXTRACTOR_MODEL = set.openai_extractor_model
+ASSISTANT_MODEL = set.openai_assistant_model
+STT_MODEL = set.openai_stt_model
+TTS_MODEL = set.openai_tts_model
+
+# Порядок сообщений в запросах: сначала неизменные инструкции, схемы инструментов и справочные
+# данные (например, метки классификации), а сообщение пользователя и текущее время - только
+# в последнем сообщении. Тогда у запросов одного вида общий префикс, который OpenAI кэширует
+# (prompt caching): ответ приходит быстрее, а входные токены префикса дешевле.
+
+############################################################
+
+# Общий пул соединений для всех запросов к OpenAI процесса
+
+_limits = httpx.Limits(
+    max_connections=set.openai_max_connections,
+    max_keepalive_connections=set.openai_max_keepalive_connections,
+    keepalive_expiry=set.openai_keepalive_expiry,
+)
+_timeout = httpx.Timeout(set.openai_deadline, connect=set.openai_connect_timeout)
+
+# Повторы выполняются в call_with_retries, поэтому встроенные повторы SDK отключены
+client = AsyncOpenAI(
+    api_key=set.openai_api_key,
+    http_client=httpx.AsyncClient(limits=_limits, timeout=_timeout),
+    max_retries=0,
+)
+
+# Ограничители допуска запросов по лимитам OpenAI (RPM/TPM) для каждого типа запросов
+chat_limiter = RateLimiter("chat", rpm=set.openai_chat_rpm, tpm=set.openai_chat_tpm)
+transcription_limiter = RateLimiter("transcription", rpm=set.openai_transcription_rpm)
+speech_limiter = RateLimiter("speech", rpm=set.openai_speech_rpm)
+
+# Ошибки, после которых запрос имеет смысл повторить
+RETRYABLE_ERRORS = (APIConnectionError, APITimeoutError, RateLimitError, InternalServerError)
+
+
+def rate_limiter_stats() -> list[dict]:
+    """
+    Глубина очередей и время ожидания всех ограничителей запросов к OpenAI.
+    """
+    return [limiter.stats() for limiter in (chat_limiter, transcription_limiter, speech_limiter)]
+
+
+def estimate_chat_tokens(kwargs: dict) -> int:
+    """
+    Грубая оценка числа токенов chat-запроса (около 4 символов на токен) для лимита TPM.
+    """
+    prompt_chars = len(json.dumps(kwargs.get("messages", []), ensure_ascii=False))
+    prompt_chars += len(json.dumps(kwargs.get("tools", []), ensure_ascii=False))
+    return prompt_chars // 4 + int(kwargs.get("max_tokens") or set.openai_expected_completion_tokens)
+
+
+# Размер промптов по типам вызовов: число вызовов и суммы токенов из usage ответов OpenAI
+prompt_usage: dict[str, dict] = {}
+
+
+def record_prompt_usage(call_name: str, usage):
+    """
+    Учитывает размер промпта вызова (в том числе токены, взятые из кэша промптов OpenAI).
+
+    Args:
+        call_name (str): Имя вызова, например "classify_and_extract_task_details".
+        usage: Поле usage ответа chat.completions.
+    """
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached_tokens = getattr(details, "cached_tokens", 0) or 0
+
+    stats = prompt_usage.setdefault(
+        call_name, {"calls": 0, "prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0}
+    )
+    stats["calls"] += 1
+    stats["prompt_tokens"] += usage.prompt_tokens
+    stats["cached_tokens"] += cached_tokens
+    stats["completion_tokens"] += usage.completion_tokens
+
+    print(
+        f"[{call_name}] prompt_tokens={usage.prompt_tokens} cached_tokens={cached_tokens} "
+        f"completion_tokens={usage.completion_tokens}"
+    )
+
+
+def prompt_usage_report() -> dict:
+    """
+    Средний размер промпта и доля токенов из кэша по каждому типу вызовов.
+    """
+    return {
+        call_name: {
+            "calls": stats["calls"],
+            "avg_prompt_tokens": stats["prompt_tokens"] / stats["calls"],
+            "avg_completion_tokens": stats["completion_tokens"] / stats["calls"],
+            "cached_share": stats["cached_tokens"] / stats["prompt_tokens"] if stats["prompt_tokens"] else 0.0,
+        }
+        for call_name, stats in prompt_usage.items()
+    }
+
+
+def _retry_after(error: RateLimitError) -> float:
+    try:
+        return float(error.response.headers.get("retry-after", 0))
+    except (AttributeError, TypeError, ValueError):
+        return 0.0
+
+
+async def call_with_retries(
+    request,
+    deadline: float | None = None,
+    max_retries: int | None = None,
+    limiter: RateLimiter | None = None,
+    tokens: int = 0,
+    priority: Priority = Priority.INTERACTIVE,
+    admission_timeout: float | None = None,
+):
+    """
+    Выполняет запрос к OpenAI с общим сроком выполнения и повторами только для повторяемых ошибок.
+
+    Перед каждой попыткой запрос проходит через ограничитель допуска. Ожидание в очереди ограничено
+    отдельным сроком admission_timeout и не расходует срок выполнения: он отсчитывается с момента
+    первого допуска, а время ожидания допуска перед повторами к нему прибавляется.
+    Между попытками выдерживается экспоненциальная задержка со случайным разбросом (full jitter).
+    Если до истечения срока не остаётся времени на задержку, повторы прекращаются.
+
+    Args:
+        request: Функция без аргументов, возвращающая корутину запроса.
+        deadline (float | None): Срок выполнения всех попыток, в секундах (по умолчанию set.openai_deadline).
+        max_retries (int | None): Максимальное число повторов (по умолчанию set.openai_max_retries).
+        limiter (RateLimiter | None): Ограничитель допуска запросов.
+        tokens (int): Оценка числа токенов запроса для лимита TPM.
+        priority (Priority): Полоса приоритета запроса.
+        admission_timeout (float | None): Срок ожидания допуска для каждой попытки, в секундах
+            (по умолчанию set.openai_admission_timeout).
+
+    Returns:
+        Результат запроса.
+
+    Raises:
+        TimeoutError: Если истёк срок выполнения или срок ожидания допуска.
+        openai.OpenAIError: Если ошибка не повторяемая или повторы исчерпаны.
+    """
+    deadline = set.openai_deadline if deadline is None else deadline
+    max_retries = set.openai_max_retries if max_retries is None else max_retries
+    admission_timeout = set.openai_admission_timeout if admission_timeout is None else admission_timeout
+
+    loop = asyncio.get_running_loop()
+    deadline_at = None
+    attempt = 0
+
+    while True:
+        try:
+            if limiter is not None:
+                async with asyncio.timeout(admission_timeout):
+                    wait = await limiter.acquire(tokens=tokens, priority=priority)
+                if deadline_at is not None:
+                    deadline_at += wait
+            if deadline_at is None:
+                deadline_at = loop.time() + deadline
+            async with asyncio.timeout_at(deadline_at):
+                return await request()
+        except RETRYABLE_ERRORS as e:
+            # 429: приостанавливаем выдачу допусков, чтобы остальные запросы ждали в очереди
+            if isinstance(e, RateLimitError) and limiter is not None:
+                limiter.backoff(_retry_after(e) or set.openai_retry_base_delay)
+            attempt += 1
+            if attempt > max_retries:
+                raise
+
+            delay = random.uniform(0, min(set.openai_retry_max_delay, set.openai_retry_base_delay * 2 ** (attempt - 1)))
+            if loop.time() + delay >= deadline_at:
+                raise
+            print(f"Повтор запроса к OpenAI ({attempt}/{max_retries}) через {delay:.2f} с: {e}")
+            await asyncio.sleep(delay)
+
+
+async def create_chat_completion(
+    deadline: float | None = None,
+    priority: Priority = Priority.INTERACTIVE,
+    call_name: str | None = None,
+    **kwargs,
+):
+    """
+    Запрос chat.completions через общий клиент с повторами и сроком выполнения.
+
+    Args:
+        deadline (float | None): Срок выполнения запроса, в секундах.
+        priority (Priority): Полоса приоритета запроса.
+        call_name (str | None): Имя вызова для отчёта о размере промптов.
+        **kwargs: Параметры client.chat.completions.create (model, messages, tools, ...).
+    """
+    estimated_tokens = estimate_chat_tokens(kwargs)
+    completion = await call_with_retries(
+        lambda: client.chat.completions.create(**kwargs),
+        deadline=deadline,
+        limiter=chat_limiter,
+        tokens=estimated_tokens,
+        priority=priority,
+    )
+
+    # Корректируем расход TPM по фактическому использованию
+    usage = getattr(completion, "usage", None)
+    if usage is not None:
+        chat_limiter.adjust_tokens(estimated_tokens, usage.total_tokens)
+        if call_name:
+            record_prompt_usage(call_name, usage)
+    return completion
+
+
+async def stream_chat_completion(deadline: float | None = None, priority: Priority = Priority.INTERACTIVE, **kwargs):
+    """
+    Потоковый запрос chat.completions: возвращает фрагменты текста по мере генерации.
+
+    Срок выполнения и повторы относятся к установке потока (до первого ответа сервера);
+    после начала генерации поток не повторяется, чтобы не дублировать уже отданный текст.
+
+    Args:
+        deadline (float | None): Срок установки потока, в секундах.
+        priority (Priority): Полоса приоритета запроса.
+        **kwargs: Параметры client.chat.completions.create (model, messages, ...).
+
+    Yields:
+        str: Очередной фрагмент текста ответа.
+    """
+    stream = await call_with_retries(
+        lambda: client.chat.completions.create(stream=True, **kwargs),
+        deadline=deadline,
+        limiter=chat_limiter,
+        tokens=estimate_chat_tokens(kwargs),
+        priority=priority,
+    )
+    async for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+
+async def create_transcription(file, deadline: float | None = None, priority: Priority = Priority.INTERACTIVE, **kwargs):
+    """
+    Запрос audio.transcriptions через общий клиент с повторами и сроком выполнения.
+
+    Args:
+        file: Аудиофайл (файловый объект или кортеж (имя, байты)).
+        deadline (float | None): Срок выполнения запроса, в секундах.
+        priority (Priority): Полоса приоритета запроса.
+        **kwargs: Остальные параметры client.audio.transcriptions.create.
+    """
+    kwargs.setdefault("model", STT_MODEL)
+
+    async def request():
+        # Файловый объект перед повтором нужно перемотать в начало
+        if hasattr(file, "seek"):
+            file.seek(0)
+        return await client.audio.transcriptions.create(file=file, **kwargs)
+
+    return await call_with_retries(request, deadline=deadline, limiter=transcription_limiter, priority=priority)
+
+
+async def create_speech(deadline: float | None = None, priority: Priority = Priority.INTERACTIVE, **kwargs):
+    """
+    Запрос audio.speech через общий клиент с повторами и сроком выполнения.
+
+    Args:
+        deadline (float | None): Срок выполнения запроса, в секундах.
+        priority (Priority): Полоса приоритета запроса (BACKGROUND для фонового озвучивания).
+        **kwargs: Параметры client.audio.speech.create (input, voice, ...).
+    """
+    kwargs.setdefault("model", TTS_MODEL)
+    return await call_with_retries(
+        lambda: client.audio.speech.create(**kwargs),
+        deadline=deadline,
+        limiter=speech_limiter,
+        priority=priority,
+    )
@@ -0,0 +1,327 @@
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from functions.config import set
+
+# Частота дискретизации, с которой работает Whisper
+SAMPLE_RATE = 16000
+
+# Окно Whisper: 30 секунд аудио на один проход модели
+WINDOW_SAMPLES = 30 * SAMPLE_RATE
+
+############################################################
+
+# Код, выполняемый в процессах-исполнителях
+
+# Модель Whisper, загруженная в процессе-исполнителе один раз при его запуске
+_model = None
+_language = None
+# Число линейных слоёв, квантованных в int8
+_quantized_layers = 0
+
+
+def _quantize_int8(model):
+    """
+    Квантует линейные слои модели Whisper в int8 (динамическое квантование torch).
+
+    Whisper использует собственный подкласс whisper.model.Linear, а quantize_dynamic
+    сопоставляет модули по точному типу и такие слои пропускает. Поэтому они сначала
+    заменяются на torch.nn.Linear с теми же весами (в fp32 слои эквивалентны).
+
+    Returns:
+        tuple: Квантованная модель и число квантованных слоёв.
+    """
+    import torch
+    import whisper.model
+
+    for module in list(model.modules()):
+        for name, child in list(module.named_children()):
+            if type(child) is whisper.model.Linear:
+                linear = torch.nn.Linear(child.in_features, child.out_features, bias=child.bias is not None)
+                linear.weight = child.weight
+                linear.bias = child.bias
+                setattr(module, name, linear)
+
+    model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    quantized = sum(isinstance(module, torch.ao.nn.quantized.dynamic.Linear) for module in model.modules())
+    return model, quantized
+
+
+def _init_worker(model_name: str, int8: bool, threads: int, language: str):
+    """
+    Загружает модель Whisper в процессе-исполнителе (вызывается один раз при запуске процесса).
+
+    Args:
+        model_name (str): Имя модели Whisper ("tiny", "base", "small", ...).
+        int8 (bool): Квантовать линейные слои модели в int8 для ускорения на CPU.
+        threads (int): Число потоков torch в процессе.
+        language (str): Язык распознавания ("" - определять автоматически).
+    """
+    global _model, _language, _quantized_layers
+
+    import torch
+    import whisper
+
+    torch.set_num_threads(threads)
+    model = whisper.load_model(model_name, device="cpu")
+    if int8:
+        model, _quantized_layers = _quantize_int8(model)
+    model.eval()
+
+    _model = model
+    _language = language or None
+
+
+def _warm_up() -> tuple[int, int]:
+    """
+    Пустая задача, гарантирующая, что процесс запущен и модель загружена.
+
+    Returns:
+        tuple: PID процесса и число линейных слоёв модели, квантованных в int8.
+    """
+    return os.getpid(), _quantized_layers
+
+
+def _transcribe(audio: np.ndarray) -> str:
+    """
+    Распознаёт речь в процессе-исполнителе.
+    """
+    result = _model.transcribe(audio, fp16=False, language=_language)
+    return result["text"].strip()
+
+
+def _transcribe_batch(clips: list[np.ndarray]) -> list[str]:
+    """
+    Распознаёт пакет коротких (до 30 секунд) записей одним проходом модели.
+
+    Каждая запись дополняется тишиной до 30 секунд (окно Whisper), log-mel спектрограммы
+    собираются в один тензор, и декодирование выполняется сразу для всего пакета.
+    """
+    import torch
+    import whisper
+
+    if len(clips) == 1:
+        return [_transcribe(clips[0])]
+
+    mels = torch.stack([
+        whisper.log_mel_spectrogram(whisper.pad_or_trim(torch.from_numpy(clip)), n_mels=_model.dims.n_mels)
+        for clip in clips
+    ])
+    options = whisper.DecodingOptions(fp16=False, language=_language, without_timestamps=True)
+    with torch.no_grad():
+        results = whisper.decode(_model, mels, options)
+    return [result.text.strip() for result in results]
+
+############################################################
+
+
+class LocalWhisperEngine:
+    """
+    Локальное распознавание речи моделью Whisper в пуле процессов.
+
+    Каждый процесс пула загружает модель один раз при запуске и держит её в памяти,
+    поэтому сообщения распознаются без загрузки модели и без обращения к сети.
+
+    Короткие записи, пришедшие почти одновременно, собираются в пакеты: записи, поступившие
+    в течение batch_window секунд после первой (но не больше max_batch), распознаются одним
+    проходом модели, а результаты раздаются ожидающим корутинам.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        workers: int,
+        int8: bool = False,
+        language: str = "",
+        batch_window: float = 0.05,
+        max_batch: int = 8,
+    ):
+        """
+        Args:
+            model_name (str): Имя модели Whisper.
+            workers (int): Число процессов-исполнителей.
+            int8 (bool): Использовать квантованную int8 модель.
+            language (str): Язык распознавания ("" - определять автоматически).
+            batch_window (float): Время сбора пакета после первой записи, в секундах.
+            max_batch (int): Максимальный размер пакета.
+        """
+        self.model_name = model_name
+        self.workers = workers
+        self.int8 = int8
+        self.language = language
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self._executor: ProcessPoolExecutor | None = None
+
+        # Записи, ожидающие отправки пакетом: (аудио, future для результата)
+        self._pending: list[tuple[np.ndarray, asyncio.Future]] = []
+        self._flush_timer: asyncio.TimerHandle | None = None
+
+        # Статистика пакетов
+        self.batches = 0
+        self.batched_clips = 0
+
+    async def start(self):
+        """
+        Запускает процессы-исполнители и дожидается загрузки моделей во всех из них.
+        """
+        # Потоки CPU делятся между процессами, чтобы они не конкурировали друг с другом
+        threads = max(1, (os.cpu_count() or 1) // self.workers)
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_init_worker,
+            initargs=(self.model_name, self.int8, threads, self.language),
+        )
+
+        loop = asyncio.get_running_loop()
+        workers = await asyncio.gather(
+            *(loop.run_in_executor(self._executor, _warm_up) for _ in range(self.workers))
+        )
+        quantized_layers = min(layers for _, layers in workers)
+        if self.int8 and quantized_layers == 0:
+            print("Квантование int8 не применилось ни к одному слою, используется модель fp32")
+        print(
+            f"Локальная модель Whisper '{self.model_name}'"
+            f"{f' (int8, {quantized_layers} слоёв)' if quantized_layers else ''} "
+            f"загружена в {len(workers)} процессах"
+        )
+
+    async def transcribe(self, audio: np.ndarray, sample_rate: int = SAMPLE_RATE) -> str:
+        """
+        Распознаёт речь в аудио.
+
+        Args:
+            audio (np.ndarray): Моно аудио float32 (результат bytesio_to_numpy).
+            sample_rate (int): Частота дискретизации аудио.
+
+        Returns:
+            str: Распознанный текст.
+        """
+        if self._executor is None:
+            raise RuntimeError("Локальный движок распознавания речи не запущен.")
+        if sample_rate != SAMPLE_RATE:
+            raise ValueError(f"Ожидается аудио с частотой {SAMPLE_RATE} Гц, получено {sample_rate} Гц.")
+
+        audio = np.ascontiguousarray(audio, dtype=np.float32)
+        if audio.ndim > 1:
+            audio = audio.mean(axis=1)
+
+        loop = asyncio.get_running_loop()
+        # Записи длиннее окна Whisper распознаются по отдельности скользящим окном
+        if len(audio) > WINDOW_SAMPLES or self.max_batch <= 1:
+            return await loop.run_in_executor(self._executor, _transcribe, audio)
+
+        future = loop.create_future()
+        self._pending.append((audio, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._flush_timer is None:
+            self._flush_timer = loop.call_later(self.batch_window, self._flush)
+        return await future
+
+    def _flush(self):
+        """
+        Отправляет накопленные записи в пул процессов одним пакетом.
+        """
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+
+        # Запросы, отменённые во время сбора пакета, не распознаём
+        batch = [(audio, future) for audio, future in self._pending if not future.done()]
+        self._pending = []
+        if not batch:
+            return
+
+        self.batches += 1
+        self.batched_clips += len(batch)
+        task = asyncio.get_running_loop().run_in_executor(
+            self._executor, _transcribe_batch, [audio for audio, _ in batch]
+        )
+        task.add_done_callback(lambda done: self._fan_out(done, [future for _, future in batch]))
+
+    @staticmethod
+    def _fan_out(done: asyncio.Future, futures: list[asyncio.Future]):
+        """
+        Раздаёт результаты пакета ожидающим корутинам.
+        """
+        if done.cancelled():
+            for future in futures:
+                future.cancel()
+            return
+        error = done.exception()
+        for i, future in enumerate(futures):
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(done.result()[i])
+
+    def stats(self) -> dict:
+        """
+        Число пакетов и средний размер пакета.
+        """
+        return {
+            "batches": self.batches,
+            "avg_batch_size": self.batched_clips / self.batches if self.batches else 0.0,
+            "pending": len(self._pending),
+        }
+
+    def shutdown(self):
+        """
+        Останавливает процессы-исполнители.
+        """
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        for _, future in self._pending:
+            future.cancel()
+        self._pending = []
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# Экземпляр движка, запускаемый при старте приложения (только при set.stt_engine == "local")
+engine: LocalWhisperEngine | None = None
+
+
+async def start_engine() -> LocalWhisperEngine | None:
+    """
+    Запускает локальный движок распознавания речи, если он выбран в настройках
+    или нужен для хеджирования запросов к Whisper API.
+
+    Returns:
+        LocalWhisperEngine | None: Движок или None, если используется Whisper API или модель недоступна.
+    """
+    global engine
+
+    if set.stt_engine != "local" and not set.stt_hedging:
+        return None
+    engine = LocalWhisperEngine(
+        model_name=set.local_stt_model,
+        workers=set.local_stt_workers,
+        int8=set.local_stt_int8,
+        language=set.local_stt_language,
+        batch_window=set.local_stt_batch_window,
+        max_batch=set.local_stt_max_batch,
+    )
+    try:
+        await engine.start()
+    except Exception as e:
+        print(f"Не удалось запустить локальную модель Whisper, используется Whisper API: {e}")
+        engine.shutdown()
+        engine = None
+    return engine
+
+
+def stop_engine():
+    """
+    Останавливает локальный движок распознавания речи при остановке приложения.
+    """
+    if engine is not None:
+        engine.shutdown()
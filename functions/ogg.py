@@ -0,0 +1,261 @@
+import random
+import struct
+
+import numpy as np
+
+# Декодер Opus (libopus через opuslib) - необязательная зависимость:
+# без него голосовые сообщения декодируются через ffmpeg
+try:
+    import opuslib
+except Exception:
+    opuslib = None
+
+# Частота, в которой Opus измеряет pre-skip и позиции гранул
+OPUS_GRANULE_RATE = 48000
+
+# Максимальная длительность одного пакета Opus - 120 мс
+MAX_PACKET_MS = 120
+
+# Максимальный размер тела страницы Ogg при сборке потока (несколько пакетов на страницу)
+MAX_PAGE_BODY = 4096
+
+# Флаги заголовка страницы Ogg
+PAGE_BOS = 0x02
+PAGE_EOS = 0x04
+
+
+def _crc_table() -> list[int]:
+    table = []
+    for byte in range(256):
+        crc = byte << 24
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x04C11DB7) if crc & 0x80000000 else (crc << 1)
+        table.append(crc & 0xFFFFFFFF)
+    return table
+
+
+# Таблица CRC-32 Ogg (полином 0x04C11DB7, без отражения битов)
+_CRC_TABLE = _crc_table()
+
+
+def opus_available() -> bool:
+    """
+    Проверяет, доступно ли декодирование Opus в процессе (установлены opuslib и libopus).
+    """
+    return opuslib is not None
+
+
+def iter_packets(data: bytes):
+    """
+    Разбирает поток Ogg на пакеты (один логический поток, как в голосовых сообщениях Telegram).
+
+    Пакет состоит из сегментов таблицы укладки страницы; сегмент длиной 255 означает,
+    что пакет продолжается в следующем сегменте (в том числе на следующей странице).
+
+    Yields:
+        bytes: Очередной пакет.
+
+    Raises:
+        ValueError: Если данные не являются корректным потоком Ogg.
+    """
+    view = memoryview(data)
+    offset = 0
+    packet = []
+    while offset < len(data):
+        if data[offset:offset + 4] != b"OggS" or offset + 27 > len(data):
+            raise ValueError(f"Некорректная страница Ogg по смещению {offset}.")
+
+        n_segments = data[offset + 26]
+        lacing = data[offset + 27:offset + 27 + n_segments]
+        body = offset + 27 + n_segments
+        if body + sum(lacing) > len(data):
+            raise ValueError("Поток Ogg обрывается посреди страницы.")
+
+        for size in lacing:
+            packet.append(view[body:body + size])
+            body += size
+            if size < 255:
+                yield b"".join(packet)
+                packet = []
+        offset = body
+
+
+def read_opus_head(packet: bytes) -> dict:
+    """
+    Разбирает заголовок OpusHead (первый пакет потока Ogg Opus).
+
+    Returns:
+        dict: channels, pre_skip, input_sample_rate, output_gain.
+    """
+    if len(packet) < 19 or not packet.startswith(b"OpusHead"):
+        raise ValueError("Поток не является Ogg Opus.")
+    channels, pre_skip, input_sample_rate, output_gain = struct.unpack_from("<BHIh", packet, 9)
+    return {
+        "channels": channels,
+        "pre_skip": pre_skip,
+        "input_sample_rate": input_sample_rate,
+        "output_gain": output_gain,
+    }
+
+
+def decode_opus(data: bytes, sample_rate: int = 16000) -> np.ndarray:
+    """
+    Декодирует Ogg Opus в моно float32 с заданной частотой без внешних процессов.
+
+    libopus сама выдаёт звук в нужной частоте (8, 12, 16, 24 или 48 кГц) и сводит стерео в моно,
+    поэтому передискретизация и промежуточный WAV не нужны.
+
+    Args:
+        data (bytes): Файл Ogg Opus (голосовое сообщение Telegram).
+        sample_rate (int): Частота дискретизации результата.
+
+    Returns:
+        np.ndarray: Моно аудио float32.
+
+    Raises:
+        RuntimeError: Если opuslib недоступна.
+        ValueError: Если данные не удалось разобрать или декодировать.
+    """
+    if opuslib is None:
+        raise RuntimeError("Декодирование Opus недоступно: не установлены opuslib и libopus.")
+
+    packets = iter_packets(data)
+    head = read_opus_head(next(packets, b""))
+    next(packets, None)  # OpusTags
+
+    decoder = opuslib.Decoder(sample_rate, 1)
+    frame_size = sample_rate * MAX_PACKET_MS // 1000
+    try:
+        pcm = b"".join(decoder.decode_float(packet, frame_size) for packet in packets if packet)
+    except opuslib.OpusError as e:
+        raise ValueError(f"Ошибка декодирования Opus: {e}")
+
+    audio = np.frombuffer(pcm, dtype=np.float32)
+    # pre-skip - отсчёты задержки кодера, которые нужно отбросить в начале потока
+    audio = audio[head["pre_skip"] * sample_rate // OPUS_GRANULE_RATE:]
+    if head["output_gain"]:
+        audio = audio * np.float32(10 ** (head["output_gain"] / (20 * 256)))
+    return audio
+
+
+def ogg_crc(data: bytes) -> int:
+    """
+    Контрольная сумма страницы Ogg.
+    """
+    crc = 0
+    for byte in data:
+        crc = ((crc << 8) & 0xFFFFFFFF) ^ _CRC_TABLE[(crc >> 24) ^ byte]
+    return crc
+
+
+def opus_packet_samples(packet: bytes) -> int:
+    """
+    Длительность пакета Opus в отсчётах 48 кГц по байту TOC (RFC 6716, раздел 3.1).
+    """
+    if not packet:
+        return 0
+    toc = packet[0]
+    config = toc >> 3
+    if config < 12:
+        # SILK: 10, 20, 40, 60 мс
+        frame_samples = (480, 960, 1920, 2880)[config % 4]
+    elif config < 16:
+        # Hybrid: 10, 20 мс
+        frame_samples = (480, 960)[config % 2]
+    else:
+        # CELT: 2.5, 5, 10, 20 мс
+        frame_samples = (120, 240, 480, 960)[config % 4]
+
+    code = toc & 0x03
+    if code == 0:
+        frames = 1
+    elif code in (1, 2):
+        frames = 2
+    else:
+        frames = packet[1] & 0x3F if len(packet) > 1 else 0
+    return frame_samples * frames
+
+
+def build_page(packets: list[bytes], granule: int, serial: int, sequence: int, header_type: int = 0) -> bytes:
+    """
+    Собирает страницу Ogg из целых пакетов.
+
+    Args:
+        packets (list): Пакеты страницы (каждый целиком помещается на страницу).
+        granule (int): Позиция гранулы после последнего пакета страницы.
+        serial (int): Серийный номер логического потока.
+        sequence (int): Номер страницы в потоке.
+        header_type (int): Флаги страницы (PAGE_BOS, PAGE_EOS).
+    """
+    lacing = bytearray()
+    for packet in packets:
+        lacing.extend(b"\xff" * (len(packet) // 255))
+        lacing.append(len(packet) % 255)
+    if len(lacing) > 255:
+        raise ValueError("Пакеты не помещаются на одну страницу Ogg.")
+
+    header = struct.pack("<4sBBqIIIB", b"OggS", 0, header_type, granule, serial, sequence, 0, len(lacing))
+    page = bytearray(header + bytes(lacing) + b"".join(packets))
+    struct.pack_into("<I", page, 22, ogg_crc(page))
+    return bytes(page)
+
+
+def concat_opus(files: list[bytes]) -> bytes:
+    """
+    Склеивает несколько файлов Ogg Opus в один поток без перекодирования.
+
+    Заголовки OpusHead и OpusTags берутся из первого файла, аудиопакеты всех файлов
+    переупаковываются в страницы одного логического потока с непрерывными позициями гранул.
+    Файлы должны иметь одинаковое число каналов (как у фрагментов одного синтеза речи).
+
+    pre-skip первого файла отбрасывается декодером по заголовку. У следующих файлов отсчёты
+    задержки кодера оказались бы посреди потока (щелчок около 6.5 мс на каждом стыке), поэтому
+    их начальные пакеты, целиком покрывающие pre-skip, отбрасываются. Вместе с ними теряется
+    остаток пакета (обычно до 20 мс начальной тишины синтеза речи).
+
+    Args:
+        files (list): Файлы Ogg Opus по порядку.
+
+    Returns:
+        bytes: Файл Ogg Opus.
+    """
+    if len(files) == 1:
+        return files[0]
+
+    header_packets = None
+    audio_packets = []
+    for data in files:
+        packets = list(iter_packets(data))
+        head = read_opus_head(packets[0] if packets else b"")
+        audio = [packet for packet in packets[2:] if packet]
+        if header_packets is None:
+            header_packets = packets[:2]
+        else:
+            # Отбрасываем пакеты с отсчётами задержки кодера (pre-skip) в начале следующего файла
+            skipped = 0
+            while audio and skipped < head["pre_skip"]:
+                skipped += opus_packet_samples(audio.pop(0))
+        audio_packets.extend(audio)
+
+    serial = random.getrandbits(32)
+    pages = [
+        build_page([header_packets[0]], granule=0, serial=serial, sequence=0, header_type=PAGE_BOS),
+        build_page([header_packets[1]], granule=0, serial=serial, sequence=1),
+    ]
+
+    # Позиция гранулы отсчитывается в отсчётах 48 кГц и включает pre-skip первого файла
+    granule = 0
+    page_packets, page_size, page_segments = [], 0, 0
+    for packet in audio_packets:
+        segments = len(packet) // 255 + 1
+        if page_packets and (page_size + len(packet) > MAX_PAGE_BODY or page_segments + segments > 255):
+            pages.append(build_page(page_packets, granule=granule, serial=serial, sequence=len(pages)))
+            page_packets, page_size, page_segments = [], 0, 0
+
+        page_packets.append(packet)
+        page_size += len(packet)
+        page_segments += segments
+        granule += opus_packet_samples(packet)
+
+    pages.append(build_page(page_packets, granule=granule, serial=serial, sequence=len(pages), header_type=PAGE_EOS))
+    return b"".join(pages)
@@ -0,0 +1,176 @@
+import asyncio
+import heapq
+import itertools
+import time
+from enum import IntEnum
+
+
+class Priority(IntEnum):
+    """
+    Полосы приоритета запросов: меньшее значение обслуживается раньше.
+    """
+    INTERACTIVE = 0  # Ответы на сообщения пользователя
+    BACKGROUND = 1   # Фоновая работа: озвучивание напоминаний, выбор чата в find_chat и т.п.
+
+
+class TokenBucket:
+    """
+    Корзина токенов, пополняемая равномерно: rate_per_minute единиц в минуту, не больше capacity.
+    """
+
+    def __init__(self, rate_per_minute: float):
+        self.capacity = float(rate_per_minute)
+        self.rate = rate_per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def time_until(self, amount: float) -> float:
+        """
+        Сколько секунд ждать, пока в корзине накопится amount единиц.
+        """
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float):
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+    def refund(self, amount: float):
+        """
+        Корректирует баланс после запроса (amount < 0 - доплата, > 0 - возврат).
+        """
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class RateLimiter:
+    """
+    Контроллер допуска запросов с ограничениями RPM/TPM и полосами приоритета.
+
+    Запросы, которые нельзя выполнить сразу, ждут в очереди вместо получения 429 от OpenAI.
+    Из очереди первыми выходят запросы с более высоким приоритетом, внутри полосы - по порядку поступления.
+    """
+
+    def __init__(self, name: str, rpm: int, tpm: int | None = None):
+        """
+        Args:
+            name (str): Имя ограничителя (для статистики и логов).
+            rpm (int): Лимит запросов в минуту.
+            tpm (int | None): Лимит токенов в минуту (None - без ограничения по токенам).
+        """
+        self.name = name
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm) if tpm else None
+
+        self._waiters: list = []
+        self._counter = itertools.count()
+        self._timer: asyncio.TimerHandle | None = None
+        self._blocked_until = 0.0
+
+        # Статистика ожидания
+        self.admitted = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.last_wait = 0.0
+
+    def _delay_for(self, tokens: int) -> float:
+        delay = max(self._blocked_until - time.monotonic(), self.requests.time_until(1))
+        if self.tokens is not None:
+            delay = max(delay, self.tokens.time_until(tokens))
+        return delay
+
+    def _dispatch(self):
+        """
+        Пропускает ожидающие запросы в порядке приоритета, пока хватает лимитов.
+        """
+        self._timer = None
+        while self._waiters:
+            _, _, tokens, future = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+
+            delay = self._delay_for(tokens)
+            if delay > 0:
+                self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+                return
+
+            heapq.heappop(self._waiters)
+            self.requests.consume(1)
+            if self.tokens is not None:
+                self.tokens.consume(tokens)
+            future.set_result(None)
+
+    async def acquire(self, tokens: int = 0, priority: Priority = Priority.INTERACTIVE) -> float:
+        """
+        Ожидает допуска запроса.
+
+        Args:
+            tokens (int): Оценка числа токенов запроса.
+            priority (Priority): Полоса приоритета.
+
+        Returns:
+            float: Время ожидания в очереди, в секундах.
+        """
+        started_at = time.monotonic()
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (int(priority), next(self._counter), tokens, future))
+
+        if self._timer is not None:
+            self._timer.cancel()
+        self._dispatch()
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            future.cancel()
+            # Отменённый запрос мог стоять первым - пересматриваем очередь
+            if self._timer is not None:
+                self._timer.cancel()
+            self._dispatch()
+            raise
+
+        wait = time.monotonic() - started_at
+        self.admitted += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        self.last_wait = wait
+        return wait
+
+    def adjust_tokens(self, estimated: int, actual: int):
+        """
+        Уточняет расход токенов после ответа OpenAI, когда известно фактическое использование.
+        """
+        if self.tokens is not None:
+            self.tokens.refund(estimated - actual)
+
+    def backoff(self, seconds: float):
+        """
+        Приостанавливает выдачу допусков после 429 от OpenAI.
+        """
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+    def stats(self) -> dict:
+        """
+        Возвращает глубину очереди по полосам и статистику ожидания.
+        """
+        depth = {priority.name.lower(): 0 for priority in Priority}
+        for priority, _, _, future in self._waiters:
+            if not future.done():
+                depth[Priority(priority).name.lower()] += 1
+        return {
+            "name": self.name,
+            "queue_depth": depth,
+            "admitted": self.admitted,
+            "avg_wait": self.total_wait / self.admitted if self.admitted else 0.0,
+            "max_wait": self.max_wait,
+            "last_wait": self.last_wait,
+        }
@@ -0,0 +1,131 @@
+import asyncio
+import logging
+import re
+
+from functions.config import set
+from functions.ftt_utils import synthesize_long_speech, send_voice_bytes
+
+# Граница предложения: знак конца предложения с пробелом после него или перевод строки
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?…])\s+|\n+")
+
+# Фоновые задачи завершения озвучивания (ссылки хранятся, чтобы задачи не были собраны сборщиком мусора)
+_finishing: list[asyncio.Task] = []
+
+
+def split_sentences(text: str) -> list[str]:
+    """
+    Разбивает текст на предложения по знакам конца предложения и переводам строк.
+    """
+    return [sentence.strip() for sentence in SENTENCE_BOUNDARY.split(text) if sentence.strip()]
+
+
+class SentenceSpeaker:
+    """
+    Озвучивание текста по предложениям, пока LLM ещё генерирует ответ.
+
+    Фрагменты потока передаются в feed(); законченные предложения сразу уходят на синтез
+    (не больше set.tts_pipeline_workers одновременно), а готовые голосовые фрагменты
+    отправляются пользователю строго в порядке предложений.
+    """
+
+    def __init__(self, chat_id: int):
+        """
+        Args:
+            chat_id (int): Идентификатор чата для голосовых сообщений.
+        """
+        self.chat_id = chat_id
+        self._buffer = ""
+        self._semaphore = asyncio.Semaphore(set.tts_pipeline_workers)
+        self._synthesis: asyncio.Queue = asyncio.Queue()
+        self._sender: asyncio.Task | None = None
+        self._fragments = 0
+
+    async def _synthesize(self, text: str) -> bytes | None:
+        async with self._semaphore:
+            try:
+                # Остаток текста без знаков препинания может превышать лимит одного запроса TTS
+                return await synthesize_long_speech(text)
+            except Exception as e:
+                logging.error(f"Ошибка синтеза фрагмента речи: {e}")
+                return None
+
+    async def _send_in_order(self):
+        # Задачи синтеза лежат в очереди в порядке предложений; None - конец текста
+        while True:
+            task = await self._synthesis.get()
+            if task is None:
+                return
+            voice = await task
+            if voice:
+                await send_voice_bytes(chat_id=self.chat_id, voice=voice)
+
+    def _speak(self, text: str):
+        if self._sender is None:
+            self._sender = asyncio.create_task(self._send_in_order())
+        self._synthesis.put_nowait(asyncio.create_task(self._synthesize(text)))
+        self._fragments += 1
+
+    def feed(self, chunk: str):
+        """
+        Принимает очередной фрагмент текста и отправляет на синтез законченные предложения.
+
+        Первое предложение озвучивается сразу, чтобы быстрее начать воспроизведение;
+        следующие объединяются, пока не наберут set.tts_pipeline_min_chars символов.
+        """
+        self._buffer += chunk
+        parts = SENTENCE_BOUNDARY.split(self._buffer)
+        if len(parts) < 2:
+            return
+
+        # Последняя часть может быть незаконченным предложением - оставляем её в буфере
+        *complete, self._buffer = parts
+        pending = ""
+        for sentence in complete:
+            pending = f"{pending} {sentence.strip()}".strip()
+            if pending and (self._fragments == 0 or len(pending) >= set.tts_pipeline_min_chars):
+                self._speak(pending)
+                pending = ""
+        if pending:
+            self._buffer = f"{pending} {self._buffer}"
+
+    async def finish(self):
+        """
+        Озвучивает остаток текста и дожидается отправки всех голосовых фрагментов.
+        """
+        if self._buffer.strip():
+            self._speak(self._buffer.strip())
+            self._buffer = ""
+        if self._sender is not None:
+            self._synthesis.put_nowait(None)
+            await self._sender
+
+    def finish_in_background(self):
+        """
+        Запускает finish() в фоне, чтобы обработчик не ждал загрузки всех голосовых фрагментов.
+        """
+        task = asyncio.create_task(self.finish())
+        _finishing.append(task)
+        task.add_done_callback(_on_finished)
+
+    async def aclose(self):
+        """
+        Прерывает озвучивание (например, при ошибке генерации ответа): отменяет синтез
+        и отправку ещё не отправленных фрагментов. После finish() ничего не делает.
+        """
+        self._buffer = ""
+        tasks = []
+        while not self._synthesis.empty():
+            task = self._synthesis.get_nowait()
+            if task is not None:
+                tasks.append(task)
+        if self._sender is not None:
+            tasks.append(self._sender)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def _on_finished(task: asyncio.Task):
+    _finishing.remove(task)
+    if not task.cancelled() and task.exception() is not None:
+        logging.error(f"Ошибка отправки голосовых фрагментов ответа: {task.exception()}")
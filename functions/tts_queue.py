@@ -0,0 +1,129 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+
+from functions.config import set
+from functions.ftt_utils import speak_text_gtts_and_send
+
+
+@dataclass
+class VoiceJob:
+    """
+    Задание на озвучивание ответа.
+    """
+    chat_id: int
+    text: str
+    created_at: float = field(default_factory=time.monotonic)
+
+
+class VoiceQueue:
+    """
+    Фоновая очередь озвучивания ответов.
+
+    Обработчики отправляют текст ответа и ставят озвучивание в очередь, не дожидаясь синтеза
+    и загрузки голосового сообщения. Каждый чат закреплён за одним исполнителем, поэтому
+    голосовые сообщения одного чата отправляются в порядке постановки в очередь, а разные чаты
+    озвучиваются параллельно.
+
+    При перегрузке устаревшие задания отбрасываются: задание старше max_age секунд не озвучивается,
+    а при заполненной очереди исполнителя вытесняется самое старое задание.
+    """
+
+    def __init__(self, workers: int, max_depth: int, max_age: float):
+        """
+        Args:
+            workers (int): Число исполнителей.
+            max_depth (int): Максимальная длина очереди одного исполнителя.
+            max_age (float): Максимальное время ожидания задания в очереди, в секундах.
+        """
+        self.workers = workers
+        self.max_depth = max_depth
+        self.max_age = max_age
+        self._queues: list[asyncio.Queue] = []
+        self._tasks: list[asyncio.Task] = []
+
+        # Статистика
+        self.submitted = 0
+        self.completed = 0
+        self.dropped = 0
+
+    def start(self):
+        """
+        Запускает исполнителей (вызывается внутри работающего цикла событий).
+        """
+        if self._tasks:
+            return
+        self._queues = [asyncio.Queue(maxsize=self.max_depth) for _ in range(self.workers)]
+        self._tasks = [asyncio.create_task(self._worker(queue)) for queue in self._queues]
+
+    async def stop(self):
+        """
+        Останавливает исполнителей; неозвученные задания отбрасываются.
+        """
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queues = []
+
+    def submit(self, chat_id: int, text: str):
+        """
+        Ставит озвучивание текста в очередь чата и сразу возвращает управление.
+
+        Args:
+            chat_id (int): Идентификатор чата.
+            text (str): Текст для озвучивания.
+        """
+        self.start()
+        queue = self._queues[hash(chat_id) % self.workers]
+        if queue.full():
+            # Вытесняем самое старое задание исполнителя - оно наименее актуально
+            queue.get_nowait()
+            queue.task_done()
+            self.dropped += 1
+        queue.put_nowait(VoiceJob(chat_id=chat_id, text=text))
+        self.submitted += 1
+
+    async def _worker(self, queue: asyncio.Queue):
+        while True:
+            job = await queue.get()
+            try:
+                if time.monotonic() - job.created_at > self.max_age:
+                    self.dropped += 1
+                    logging.warning(f"Озвучивание для чата {job.chat_id} отброшено: задание устарело")
+                    continue
+                await speak_text_gtts_and_send(chat_id=job.chat_id, text=job.text)
+                self.completed += 1
+            except Exception as e:
+                logging.error(f"Ошибка фонового озвучивания для чата {job.chat_id}: {e}")
+            finally:
+                queue.task_done()
+
+    def stats(self) -> dict:
+        """
+        Глубина очередей исполнителей и счётчики заданий.
+        """
+        depths = [queue.qsize() for queue in self._queues]
+        return {
+            "depth": sum(depths),
+            "max_worker_depth": max(depths, default=0),
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "dropped": self.dropped,
+        }
+
+
+# Общая очередь озвучивания процесса
+voice_queue = VoiceQueue(
+    workers=set.tts_queue_workers,
+    max_depth=set.tts_queue_max_depth,
+    max_age=set.tts_queue_max_age,
+)
+
+
+def speak_in_background(chat_id: int, text: str):
+    """
+    Ставит озвучивание ответа в фоновую очередь (см. VoiceQueue).
+    """
+    voice_queue.submit(chat_id=chat_id, text=text)
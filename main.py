@@ -4,8 +4,13 @@ import sys
 from telegram_bot.handlers import register_handlers1, dp
 
 import functions.config as config
+from functions.ftt_utils import close_http_session, prewarm_voice_cache
+from functions.local_stt import start_engine, stop_engine
+from functions.tts_queue import voice_queue
+from api_gateway.intent_model import load_intent_classifier
 
 from microservices.assistant_tasks.scheduler.schedule import run_scheduler
+from microservices.assistant_tasks.telegram.bot import load_known_chats
 from microservices.assistant_tasks.telegram.incoming_message_handler import real_time_message_listener
 
 # logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', stream=sys.stdout)
@@ -15,6 +20,21 @@ async def main() -> None:
     Асинхронная основная функция для запуска планировщика задач и Telegram-бота.
     """
     try:
+        # Загрузка локального классификатора намерений
+        load_intent_classifier()
+
+        # Загрузка имён чатов Telegram для быстрого разбора команд
+        await load_known_chats()
+
+        # Запуск локальной модели распознавания речи (если выбрана в настройках)
+        await start_engine()
+
+        # Запуск фоновой очереди озвучивания ответов
+        voice_queue.start()
+
+        # Озвучивание неизменных фраз ответов в кэш (если задан служебный чат)
+        asyncio.create_task(prewarm_voice_cache())
+
         # Запуск планировщика задач как отдельной фоновой задачи
         asyncio.create_task(run_scheduler())
         
@@ -26,6 +46,10 @@ async def main() -> None:
         await dp.start_polling(config.bot_tg)
     except Exception as e:
         logging.error(f"Ошибка в основной функции: {e}")
+    finally:
+        await voice_queue.stop()
+        stop_engine()
+        await close_http_session()
 
 if __name__ == "__main__":
     asyncio.run(main())
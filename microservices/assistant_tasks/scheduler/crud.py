@@ -3,6 +3,18 @@ from sqlalchemy.future import select
 from microservices.assistant_tasks.scheduler.models import User, Task
 
 
+# Обработчики, вызываемые после добавления задачи (например, таймер планировщика)
+task_added_listeners: list = []
+
+
+def add_task_listener(listener):
+    """
+    Подписывает функцию listener(task) на добавление задач через add_task.
+    """
+    if listener not in task_added_listeners:
+        task_added_listeners.append(listener)
+
+
 async def get_or_create_user(session: AsyncSession, telegram_id: str):
     result = await session.execute(select(User).filter_by(telegram_id=telegram_id))
     user = result.scalars().first()
@@ -26,6 +38,12 @@ async def add_task(session: AsyncSession, telegram_id: str, text: str, start_tim
     )
     session.add(task)
     await session.commit()
+
+    for listener in task_added_listeners:
+        try:
+            listener(task)
+        except Exception as e:
+            print(f"Ошибка обработчика добавления задачи: {e}")
     return task
 
 
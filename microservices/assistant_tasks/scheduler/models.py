@@ -1,6 +1,6 @@
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, func
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index, func
 from sqlalchemy.orm import relationship
 
 Base = declarative_base()
@@ -22,8 +22,13 @@ class Task(Base):
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     text = Column(String, nullable=False)
-    start_time = Column(DateTime, nullable=False)
+    start_time = Column(DateTime, nullable=False, index=True)  # ix_tasks_start_time - выборка наступивших задач
     repeat_interval = Column(String, nullable=True)  # "daily", "weekly", NULL
     created_at = Column(DateTime, default=func.now())
 
     user = relationship("User", back_populates="tasks")
+
+    __table_args__ = (
+        # Задачи пользователя в порядке срока
+        Index("ix_tasks_user_id_start_time", "user_id", "start_time"),
+    )
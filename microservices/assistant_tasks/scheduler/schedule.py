@@ -1,4 +1,5 @@
 import asyncio
+import heapq
 import schedule
 from datetime import datetime, timedelta
 import asyncpg
@@ -6,12 +7,114 @@ import asyncpg
 from sqlalchemy.orm import joinedload
 from sqlalchemy import text 
 from sqlalchemy.future import select
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
 
 from microservices.assistant_tasks.scheduler.database_utils import async_session, engine, DATABASE_URL
 from microservices.assistant_tasks.scheduler.models import Task
 import microservices.assistant_tasks.scheduler.crud as crud
 
-from functions.config import bot_tg
+from functions.config import bot_tg, set
+from functions.rate_limiter import Priority
+from functions.ftt_utils import (
+    synthesize_long_speech,
+    send_voice_bytes,
+    send_cached_voice,
+    remember_voice,
+    voice_cache,
+    voice_cache_key,
+)
+
+# Заранее озвученные напоминания: ключ (задача, текст) -> аудио Ogg/Opus
+prerendered_reminders: dict[str, bytes] = {}
+
+# Фоновые задачи озвучивания (ссылки хранятся, чтобы задачи не были собраны сборщиком мусора)
+_prerender_tasks: dict[str, asyncio.Task] = {}
+
+# Ограничение одновременных отправок напоминаний (лимиты Bot API)
+_send_semaphore = asyncio.Semaphore(set.reminder_send_concurrency)
+
+
+def reminder_voice_text(task: Task) -> str:
+    """
+    Текст голосового напоминания (без времени, чтобы повторяющиеся задачи озвучивались один раз).
+    """
+    return f"Напоминание: {task.text}"
+
+
+def reminder_voice_key(task: Task) -> str:
+    """
+    Ключ заранее озвученного напоминания: ID задачи и хэш текста.
+    """
+    return f"{task.id}:{voice_cache_key(reminder_voice_text(task))}"
+
+
+async def _prerender_reminder(key: str, text: str):
+    try:
+        # Напоминание уже отправлялось - его file_id есть в кэше озвученных фраз
+        if await voice_cache.get(voice_cache_key(text)) is not None:
+            return
+        prerendered_reminders[key] = await synthesize_long_speech(text, priority=Priority.BACKGROUND)
+    except Exception as e:
+        print(f"Ошибка предварительного озвучивания напоминания: {e}")
+    finally:
+        _prerender_tasks.pop(key, None)
+
+
+def prerender_reminder(task: Task):
+    """
+    Запускает фоновое озвучивание напоминания задачи, если оно ещё не озвучено и не озвучивается.
+    """
+    key = reminder_voice_key(task)
+    if key in prerendered_reminders or key in _prerender_tasks:
+        return
+    _prerender_tasks[key] = asyncio.create_task(_prerender_reminder(key, reminder_voice_text(task)))
+
+
+async def prerender_reminders(session, current_time: datetime):
+    """
+    Озвучивает напоминания задач, срок которых наступит в ближайшие set.reminder_prerender_minutes минут.
+
+    Озвучивание выполняется в фоне с низким приоритетом; к моменту напоминания остаётся
+    только отправить готовое аудио (или file_id, если такое напоминание уже отправлялось).
+    Аудио задач, которые вышли из окна (удалены или перенесены), освобождается.
+    """
+    result = await session.execute(
+        select(Task).where(
+            Task.start_time > current_time,
+            Task.start_time <= current_time + timedelta(minutes=set.reminder_prerender_minutes),
+        )
+    )
+    upcoming = {reminder_voice_key(task): task for task in result.scalars().all()}
+
+    for key in list(prerendered_reminders):
+        if key not in upcoming:
+            del prerendered_reminders[key]
+
+    for task in upcoming.values():
+        prerender_reminder(task)
+
+
+async def send_reminder_voice(chat_id, task: Task):
+    """
+    Отправляет голосовое напоминание: по file_id из кэша, готовое аудио или, если его нет, синтезирует.
+    """
+    text = reminder_voice_text(task)
+    cache_key = voice_cache_key(text)
+
+    message = await send_cached_voice(chat_id=chat_id, cache_key=cache_key)
+    if message is not None:
+        return
+
+    voice = prerendered_reminders.pop(reminder_voice_key(task), None)
+    if voice is None:
+        try:
+            voice = await synthesize_long_speech(text)
+        except Exception as e:
+            print(f"Ошибка озвучивания напоминания: {e}")
+            return
+
+    message = await send_voice_bytes(chat_id=chat_id, voice=voice)
+    await remember_voice(cache_key, message)
 
 
 # async def run_scheduler():
@@ -42,35 +145,298 @@ from functions.config import bot_tg
 #     finally:
 #         await conn.close()
 
+async def ensure_task_indexes():
+    """
+    Создаёт индексы таблицы tasks, объявленные в models.py, если их ещё нет в базе
+    (create_all не добавляет индексы к уже существующей таблице).
+    """
+    async with engine.begin() as conn:
+        await conn.run_sync(
+            lambda sync_conn: [index.create(sync_conn, checkfirst=True) for index in Task.__table__.indexes]
+        )
+
+
+def current_scheduler_time() -> datetime:
+    """
+    Текущие дата и время планировщика (UTC+3, как start_time задач).
+    """
+    return datetime.utcnow() + timedelta(hours=3)
+
+
+class TaskTimer:
+    """
+    Таймер задач: min-куча (start_time, task_id) задач, срок которых наступит в ближайшем окне.
+
+    Окно (set.scheduler_lookahead_minutes) загружается из базы одним запросом по индексу
+    и перезагружается, когда пройдена его половина; задачи, добавленные через crud.add_task,
+    попадают в кучу сразу. Планировщик спит ровно до ближайшего срока.
+
+    Устаревшие записи кучи (задача перенесена) пропускаются при извлечении; удалённые
+    задачи отсеиваются при загрузке из базы.
+    """
+
+    def __init__(self, lookahead: timedelta):
+        """
+        Args:
+            lookahead (timedelta): Размер окна загрузки задач.
+        """
+        self.lookahead = lookahead
+        self._heap: list[tuple[datetime, int]] = []
+        # Актуальный срок каждой задачи в куче
+        self._scheduled: dict[int, datetime] = {}
+        self.loaded_until: datetime | None = None
+        self._wakeup = asyncio.Event()
+
+    async def load(self, session, current_time: datetime):
+        """
+        Загружает из базы задачи со сроком до current_time + lookahead (включая просроченные).
+        """
+        loaded_until = current_time + self.lookahead
+        result = await session.execute(
+            select(Task.id, Task.start_time).where(Task.start_time <= loaded_until)
+        )
+        self._scheduled = {task_id: start_time for task_id, start_time in result.all()}
+        self._heap = [(start_time, task_id) for task_id, start_time in self._scheduled.items()]
+        heapq.heapify(self._heap)
+        self.loaded_until = loaded_until
+
+    def needs_reload(self, current_time: datetime) -> bool:
+        return self.loaded_until is None or current_time >= self.loaded_until - self.lookahead / 2
+
+    def push(self, task_id: int, start_time: datetime):
+        """
+        Добавляет (или переносит) задачу, если её срок попадает в загруженное окно.
+        """
+        if self.loaded_until is None or start_time > self.loaded_until:
+            return
+        self._scheduled[task_id] = start_time
+        heapq.heappush(self._heap, (start_time, task_id))
+        self._wakeup.set()
+
+    def _drop_stale(self):
+        while self._heap and self._scheduled.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+
+    def next_due(self) -> datetime | None:
+        """
+        Ближайший срок задачи в куче.
+        """
+        self._drop_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, current_time: datetime) -> list[int]:
+        """
+        Извлекает ID задач, срок которых наступил.
+        """
+        due_ids = []
+        while self.next_due() is not None and self._heap[0][0] <= current_time:
+            _, task_id = heapq.heappop(self._heap)
+            del self._scheduled[task_id]
+            due_ids.append(task_id)
+        return due_ids
+
+    async def sleep_until(self, wake_at: datetime):
+        """
+        Спит до wake_at или до добавления новой задачи в кучу.
+        """
+        self._wakeup.clear()
+        delay = (wake_at - current_scheduler_time()).total_seconds()
+        if delay <= 0:
+            return
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+        except asyncio.TimeoutError:
+            pass
+
+    def stats(self) -> dict:
+        return {
+            "scheduled": len(self._scheduled),
+            "heap_size": len(self._heap),
+            "next_due": self.next_due(),
+            "loaded_until": self.loaded_until,
+        }
+
+
+# Таймер задач процесса
+task_timer = TaskTimer(lookahead=timedelta(minutes=set.scheduler_lookahead_minutes))
+
+
+def _on_task_added(task: Task):
+    task_timer.push(task.id, task.start_time)
+
+    # Задача в пределах окна озвучивания - озвучиваем сразу, не дожидаясь перезагрузки окна
+    if set.reminder_voice and task.start_time <= current_scheduler_time() + timedelta(minutes=set.reminder_prerender_minutes):
+        prerender_reminder(task)
+
+
 async def run_scheduler():
     """
     Асинхронный планировщик задач.
-    Проверяет задачи из базы данных и запускает их выполнение, если их время наступило.
+    Запускает задачи ровно в момент наступления их срока, обращаясь к базе только
+    для загрузки окна ближайших задач и выполнения наступивших.
     """
+    try:
+        await ensure_task_indexes()
+    except Exception as e:
+        print(f"Ошибка создания индексов таблицы задач: {e}")
+
+    crud.add_task_listener(_on_task_added)
+
     while True:
         try:
             # Получаем текущую дату и время с учетом смещения UTC+3
-            current_time = datetime.utcnow() + timedelta(hours=3)
+            current_time = current_scheduler_time()
 
             async with async_session() as session:
-                # Получаем все задачи с предзагрузкой связанных пользователей
-                tasks = await session.execute(
-                    select(Task).options(joinedload(Task.user))
-                )
-                tasks = tasks.scalars().all()
+                # Загружаем окно ближайших задач и озвучиваем скорые напоминания
+                if task_timer.needs_reload(current_time):
+                    await task_timer.load(session, current_time)
+                    if set.reminder_voice:
+                        await prerender_reminders(session, current_time)
 
-                # Проверяем задачи на выполнение
-                for task in tasks:
-                    if task.start_time <= current_time:
-                        print(f"Запуск задачи с ID {task.id}, текст: {task.text}")
-                        await process_task(task.id)
+                # Выполняем задачи, срок которых наступил
+                due_ids = task_timer.pop_due(current_time)
+                if due_ids:
+                    tasks = await process_due_tasks(session, current_time, task_ids=due_ids)
 
+                    # Повторяющиеся задачи возвращаются в таймер с новым (будущим) сроком
+                    for task in tasks:
+                        if task.repeat_interval and task.start_time > current_time:
+                            task_timer.push(task.id, task.start_time)
 
-            # Задержка для снижения нагрузки (например, 60 секунд)
-            await asyncio.sleep(60)
+            # Спим до ближайшего срока или до перезагрузки окна
+            reload_at = task_timer.loaded_until - task_timer.lookahead / 2
+            next_due = task_timer.next_due()
+            await task_timer.sleep_until(min(next_due, reload_at) if next_due else reload_at)
 
         except Exception as e:
             print(f"Ошибка в планировщике: {e}")
+            await asyncio.sleep(1)
+
+
+async def process_due_tasks(session, current_time: datetime, task_ids: list[int] | None = None) -> list[Task]:
+    """
+    Выполняет задачи, срок которых наступил, пакетами в одной сессии.
+
+    ID задач выбираются одним запросом по индексу ix_tasks_start_time (или передаются таймером),
+    затем задачи загружаются вместе с пользователями пакетами по set.scheduler_batch_size;
+    напоминания пакета отправляются параллельно (не больше set.reminder_send_concurrency),
+    изменения пакета фиксируются одним commit. Задачи, напоминание которых не удалось отправить,
+    не выполняются и остаются в базе до следующей загрузки окна таймера.
+
+    Args:
+        session: Сессия базы данных.
+        current_time (datetime): Текущее время планировщика.
+        task_ids (list | None): ID наступивших задач (None - выбрать из базы).
+
+    Returns:
+        list: Выполненные задачи.
+    """
+    if task_ids is None:
+        result = await session.execute(
+            select(Task.id).where(Task.start_time <= current_time).order_by(Task.start_time, Task.id)
+        )
+        task_ids = result.scalars().all()
+
+    completed = []
+    for start in range(0, len(task_ids), set.scheduler_batch_size):
+        batch_ids = task_ids[start:start + set.scheduler_batch_size]
+        # Условие на срок отсеивает задачи, перенесённые или удалённые после загрузки в таймер
+        result = await session.execute(
+            select(Task)
+            .options(joinedload(Task.user))
+            .where(Task.id.in_(batch_ids), Task.start_time <= current_time)
+            .order_by(Task.start_time, Task.id)
+        )
+        tasks = result.scalars().all()
+
+        sent = await asyncio.gather(*(send_reminder(task) for task in tasks))
+        sent_tasks = [task for task, ok in zip(tasks, sent) if ok]
+        for task in sent_tasks:
+            await complete_task(session, task, current_time)
+        await session.commit()
+        completed.extend(sent_tasks)
+
+    return completed
+
+
+async def _send_with_retry(send):
+    """
+    Выполняет отправку в Telegram, выдерживая паузу retry_after при превышении лимитов Bot API.
+    """
+    for attempt in range(set.reminder_send_retries + 1):
+        try:
+            return await send()
+        except TelegramRetryAfter as e:
+            if attempt == set.reminder_send_retries:
+                raise
+            print(f"Превышен лимит Bot API, повтор отправки через {e.retry_after} с")
+            await asyncio.sleep(e.retry_after)
+
+
+async def send_reminder(task: Task) -> bool:
+    """
+    Отправляет пользователю текстовое и голосовое напоминание о задаче.
+
+    Returns:
+        bool: False, если текстовое напоминание не отправлено и его нужно повторить позже;
+            ошибка голосового напоминания и отказ Telegram (бот заблокирован, чат не найден) не повторяются.
+    """
+    print(f"\n\nВыполняется задача: {task.text}\n\n")
+
+    telegram_id = task.user.telegram_id
+
+    async with _send_semaphore:
+        # Отправляем сообщение пользователю в Telegram
+        try:
+            await _send_with_retry(lambda: bot_tg.send_message(
+                chat_id=telegram_id,  # Используем связанный telegram_id из модели User
+                text=f"Напоминание: {task.text}\nДата и время: {task.start_time}"
+            ))
+        except (TelegramForbiddenError, TelegramBadRequest) as e:
+            print(f"Напоминание не может быть доставлено: {e}")
+            return True
+        except Exception as e:
+            print(f"Ошибка отправки сообщения: {e}")
+            return False
+
+        # Голосовое напоминание (обычно уже озвучено заранее)
+        if set.reminder_voice:
+            try:
+                await _send_with_retry(lambda: send_reminder_voice(chat_id=telegram_id, task=task))
+            except Exception as e:
+                print(f"Ошибка отправки голосового напоминания: {e}")
+    return True
+
+
+# Интервалы повторения задач
+REPEAT_INTERVALS = {
+    "daily": timedelta(days=1),
+    "weekly": timedelta(weeks=1),
+}
+
+
+async def complete_task(session, task: Task, current_time: datetime | None = None):
+    """
+    Переносит повторяющуюся задачу на следующий срок или удаляет разовую (без commit).
+
+    Просроченная повторяющаяся задача (например, после простоя) переносится сразу на ближайший
+    срок после current_time. Задача с неизвестным интервалом повторения выполняется как разовая.
+    """
+    interval = REPEAT_INTERVALS.get(task.repeat_interval) if task.repeat_interval else None
+    if task.repeat_interval and interval is None:
+        print(f"Неизвестный интервал повторения '{task.repeat_interval}' задачи {task.id}, задача выполнена как разовая")
+
+    # Если задача повторяется, обновляем время
+    if interval is not None:
+        if current_time is None:
+            current_time = current_scheduler_time()
+        steps = (current_time - task.start_time) // interval + 1 if task.start_time <= current_time else 1
+        task.start_time += interval * steps
+        session.add(task)
+    else:
+        # Если задача не повторяется, удаляем её
+        await session.delete(task)
 
 
 async def process_task(task_id: int):
@@ -84,30 +450,6 @@ async def process_task(task_id: int):
         )
         task = task_result.scalar_one_or_none()
         
-        if task:
-            print(f"\n\nВыполняется задача: {task.text}\n\n")
-            
-            telegram_id = task.user.telegram_id
-            
-            # Отправляем сообщение пользователю в Telegram
-            try:
-                await bot_tg.send_message(
-                    chat_id=telegram_id,  # Используем связанный telegram_id из модели User
-                    text=f"Напоминание: {task.text}\nДата и время: {task.start_time}"
-                )
-            except Exception as e:
-                print(f"Ошибка отправки сообщения: {e}")
-            
-            # Если задача повторяется, обновляем время
-            if task.repeat_interval:
-                if task.repeat_interval == "daily":
-                    task.start_time += timedelta(days=1)
-                elif task.repeat_interval == "weekly":
-                    task.start_time += timedelta(weeks=1)
-                session.add(task)
-            else:
-                # Если задача не повторяется, удаляем её
-                await session.delete(task)
-            
+        if task and await send_reminder(task):
+            await complete_task(session, task)
             await session.commit()
-
@@ -0,0 +1,69 @@
+import pytest
+from datetime import datetime
+
+from microservices.assistant_tasks.scheduler.utils import parse_reminder
+
+
+# Текущее время для всех проверок: 18 октября 2026, 14:00
+CURRENT_TIME = datetime(2026, 10, 18, 14, 0)
+
+# Тестовые данные: сообщение и ожидаемый результат быстрого разбора
+# (None - сообщение должно уйти на разбор LLM)
+test_cases = [
+    # Время с уточнением части суток
+    {
+        "input": "напомни мне в 7 часов вечера позвонить маме",
+        "expected": {"task_text": "Позвонить маме", "start_time": datetime(2026, 10, 18, 19, 0), "repeat_interval": "NULL"},
+    },
+    {
+        "input": "напомни в 3 часа дня позвонить",
+        "expected": {"task_text": "Позвонить", "start_time": datetime(2026, 10, 18, 15, 0), "repeat_interval": "NULL"},
+    },
+    {
+        "input": "напомни в 1 час ночи позвонить",
+        "expected": {"task_text": "Позвонить", "start_time": datetime(2026, 10, 19, 1, 0), "repeat_interval": "NULL"},
+    },
+    {
+        "input": "напомни в 9 утра выпить таблетки",
+        "expected": {"task_text": "Выпить таблетки", "start_time": datetime(2026, 10, 19, 9, 0), "repeat_interval": "NULL"},
+    },
+    {
+        "input": "remind me at 7 o'clock to call John",
+        "expected": {"task_text": "Call John", "start_time": datetime(2026, 10, 19, 7, 0), "repeat_interval": "NULL"},
+    },
+    {
+        "input": "remind me at 7 pm to call John",
+        "expected": {"task_text": "Call John", "start_time": datetime(2026, 10, 18, 19, 0), "repeat_interval": "NULL"},
+    },
+    # Относительное время и повторение
+    {
+        "input": "напомни через 15 минут выключить плиту",
+        "expected": {"task_text": "Выключить плиту", "start_time": datetime(2026, 10, 18, 14, 15), "repeat_interval": "NULL"},
+    },
+    {
+        "input": "напомни мне завтра в 10:00 позвонить маме",
+        "expected": {"task_text": "Позвонить маме", "start_time": datetime(2026, 10, 19, 10, 0), "repeat_interval": "NULL"},
+    },
+    {
+        "input": "напоминай каждый день в 9:00 выпить таблетки",
+        "expected": {"task_text": "Выпить таблетки", "start_time": datetime(2026, 10, 19, 9, 0), "repeat_interval": "daily"},
+    },
+    # Указания времени, которые быстрый разбор не понимает - остаются за LLM
+    {"input": "напомни в среду в 10:00 позвонить", "expected": None},
+    {"input": "напомни 25 декабря в 10:00 купить ёлку", "expected": None},
+    {"input": "напомни через 2 часа и 30 минут выключить плиту", "expected": None},
+    {"input": "напомни через час завтра позвонить", "expected": None},
+    {"input": "напомни в 7 позвонить вечером", "expected": None},
+    {"input": "напомни в 10:00 о встрече 12.11", "expected": None},
+]
+
+
+@pytest.mark.parametrize("test_case", test_cases, ids=[test_case["input"] for test_case in test_cases])
+def test_parse_reminder(test_case):
+    result = parse_reminder(test_case["input"], CURRENT_TIME)
+    if test_case["expected"] is None:
+        assert result is None
+    else:
+        assert result is not None
+        assert result["task_details"] == test_case["expected"]
+        assert result["confidence"] >= 0.85
@@ -2,7 +2,6 @@ import json
 from datetime import datetime, timedelta
 import re
 import asyncio
-from openai import AsyncOpenAI
 
 from aiogram.types import Message
 
@@ -17,109 +16,270 @@ from microservices.assistant_tasks.scheduler.database_utils import async_session
 import microservices.assistant_tasks.scheduler.schedule as schedule
 
 # Импорт отправки сообщения в голосе
-from functions.ftt_utils import speak_text_gtts_and_send
+from functions.tts_queue import speak_in_background
 
-client = AsyncOpenAI(
-    api_key=config.set.openai_api_key
+# Общий клиент OpenAI
+import functions.llm_client as llm_client
+
+# JSON-схема аргументов задачи планировщика
+TASK_DETAILS_PARAMETERS = {
+    "type": "object",
+    "properties": {
+        "task_text": {
+            "type": "string", 
+            "description": """
+                Paraphrase the task description, converting it into a neutral and appropriate form, ensuring that:
+                - The task text MUST does not include any reference to the EXECUTION DATE or TIME INTERVAL.
+                - The resulting text MUST BE is concise, focusing solely on the essence of the task.
+
+                For example:
+                - Original: "Make an appointment with Oleg for tomorrow." → Result: "Meeting with Oleg.".
+                - Original: "Call the client at 3 pm." → Result: "Call to client.".
+
+                !!! If task_text is NOT defined in the user's request, return only False !!!
+            """
+        },
+        "start_time": {
+            "type": "string",
+            "description": """
+                The start time of the task in ISO 8601 format (e.g., 2024-12-01 14:00:00). 
+                !!! If start_time NOT defined in the user's request, return only False !!!
+            """
+        },
+        "repeat_interval": {
+            "type": "string",
+            "description": "The repeat interval of the task (e.g., 'daily', 'weekly', or 'NULL' for no repetition)."
+        },
+    },
+    "required": ["task_text", "start_time", "repeat_interval"],
+    "additionalProperties": False,
+}
+
+TASK_DETAILS_TOOLS = [
+    {
+        "type": "function",
+        "function": {
+            "name": "classify_text",
+            "description": "Classify and extract task details for scheduling. ",
+            "parameters": TASK_DETAILS_PARAMETERS,
+        }
+    }
+]
+
+# Инструкции извлечения параметров задачи
+TASK_DETAILS_INSTRUCTIONS = """
+    You are a scheduling assistant.
+    Process the scheduling request from the last user message, using the current datetime given there.
+    Return the task details in this format: task_text, start_time (ISO 8601), and repeat_interval ('daily', 'weekly', or 'NULL').
+    If task_text or start_time or both of them NOT defined in the request, return instead of him (them) only False
+"""
+
+
+def parse_task_details(result: dict, current_datetime: datetime) -> dict:
+    """
+    Приводит аргументы, полученные от модели, к формату, который ожидает process_user_task.
+
+    Args:
+        result (dict): Аргументы вызова функции, возвращённые моделью.
+        current_datetime (datetime): Текущая дата и время, переданные модели.
+
+    Returns:
+        dict: task_text, start_time (datetime или False) и repeat_interval.
+    """
+    # Проверяем каждое поле и обрабатываем отсутствующие данные
+    task_text = result.get("task_text", None)
+    start_time_raw = result.get("start_time", None)
+    repeat_interval = result.get("repeat_interval", None)
+
+    # Если данных нет, устанавливаем значение False
+    if not task_text or str(task_text) == "False":
+        task_text = False
+
+    try:
+        start_time_raw = datetime.fromisoformat(str(start_time_raw))
+        if start_time_raw == current_datetime:
+            start_time_raw = False
+    except ValueError:
+        start_time_raw = False
+
+    # Устанавливаем значение 'NULL' по умолчанию, если repeat_interval отсутствует
+    if not repeat_interval:
+        repeat_interval = 'NULL'
+
+    return {
+        "task_text": task_text,
+        "start_time": start_time_raw,
+        "repeat_interval": repeat_interval,
+    }
+
+
+# Начало команды напоминания: "напомни (мне)", "поставь напоминание", "remind me"
+_REMINDER_PREFIX = re.compile(r"^(?P<prefix>(?:напомни|напоминай)(?:те)?(?P<me>\s+мне)?|поставь\s+напоминание|remind\s+me)\b[\s,]*", re.IGNORECASE)
+
+# Относительное время: "через 15 минут", "через час", "in 2 hours"
+_RELATIVE_TIME = re.compile(
+    r"\b(?:через|in)\s+(?:(?P<amount>\d+)\s+)?(?P<unit>полчаса|минут[уы]?|мин|час(?:а|ов)?|дн(?:я|ей)|день|minutes?|mins?|hours?|days?)\b",
+    re.IGNORECASE,
+)
+
+# Абсолютное время: "в 10:30", "в 9 утра", "в 7 часов вечера", "at 7 pm", "at 7 o'clock"
+_ABSOLUTE_TIME = re.compile(
+    r"\b(?:в|во|at)\s+(?P<hour>\d{1,2})(?:[:.](?P<minute>\d{2}))?"
+    r"(?:\s*(?P<hours_word>час(?:а|ов)?|o'clock)\b)?(?:\s*(?P<suffix>am|pm|утра|вечера|дня|ночи)\b)?",
+    re.IGNORECASE,
 )
 
+# День: "сегодня", "завтра", "послезавтра", "today", "tomorrow"
+_DAY_WORD = re.compile(r"\b(?P<day>послезавтра|завтра|сегодня|tomorrow|today)\b", re.IGNORECASE)
+_DAY_OFFSETS = {"сегодня": 0, "today": 0, "завтра": 1, "tomorrow": 1, "послезавтра": 2}
+
+# Повторение: "каждый день", "еженедельно", "every week"
+_REPEAT = re.compile(
+    r"\b(?:(?P<daily>каждый\s+день|ежедневно|every\s+day|daily)|(?P<weekly>каждую\s+неделю|еженедельно|every\s+week|weekly))\b",
+    re.IGNORECASE,
+)
+
+# Связки перед текстом задачи: "напомни, что нужно позвонить", "remind me to call"
+_TASK_CONNECTOR = re.compile(r"^(?:что(?:бы)?|to|about)\s+", re.IGNORECASE)
+
+# Указания времени, которые быстрый разбор не понимает: дни недели, месяцы, даты, "N единиц времени".
+# Если после разбора они остались в тексте задачи, время определено неверно ("в среду в 10:00",
+# "25 декабря", "через 2 часа и 30 минут") - такие сообщения разбирает LLM
+_UNPARSED_TIME = re.compile(
+    r"\b(?:понедельник\w*|вторник\w*|сред[аеуы]|четверг\w*|пятниц\w*|суббот\w*|воскресень\w*|выходн\w+"
+    r"|monday|tuesday|wednesday|thursday|friday|saturday|sunday|weekend"
+    r"|январ\w*|феврал\w*|март\w*|апрел\w*|ма[йя]|июн\w*|июл\w*|август\w*|сентябр\w*|октябр\w*|ноябр\w*|декабр\w*"
+    r"|january|february|march|april|june|july|august|september|october|november|december"
+    r"|полчаса|полтора|неделю|месяц|год"
+    r"|утра|вечера|дня|ночи|утром|вечером|дн[её]м|ночью|полдень|полночь|am|pm|o'clock|morning|evening|night|noon|midnight"
+    r"|послезавтра|завтра|сегодня|tomorrow|today|tonight"
+    r"|\d+(?:-?(?:го|е|st|nd|rd|th))?\s+числа|\d+(?:st|nd|rd|th)"
+    r"|\d{1,2}[:./]\d{1,2}(?:[./]\d{2,4})?"
+    r"|\d+\s*(?:сек\w*|мин\w*|час\w*|дн\w*|день|недел\w*|месяц\w*|год\w*|лет|seconds?|secs?|minutes?|mins?|hours?|days?|weeks?|months?|years?))\b",
+    re.IGNORECASE,
+)
+
+
+def parse_reminder(message_text: str, current_datetime: datetime) -> dict | None:
+    """
+    Детерминированный разбор частых формулировок напоминаний без обращения к OpenAI.
+
+    Поддерживает "напомни (мне) [завтра] в 10:00 позвонить маме", "напомни через 15 минут выключить плиту",
+    "напоминай каждый день в 9:00 выпить таблетки", "remind me tomorrow at 7 pm to call John", "remind me in 10 minutes to ...".
+
+    Args:
+        message_text (str): Сообщение пользователя.
+        current_datetime (datetime): Текущая дата и время.
+
+    Returns:
+        dict | None: {"task_details": {...}, "confidence": float} в формате classify_and_extract_task_details
+            или None, если сообщение не похоже на напоминание.
+    """
+    text = " ".join(message_text.strip().split()).rstrip(".!")
+    prefix = _REMINDER_PREFIX.match(text)
+    if not prefix:
+        return None
+
+    confidence = 0.95
+    rest = text[prefix.end():]
+
+    # "Напомни Олегу о встрече" - просьба написать другому человеку, а не напоминание себе
+    if not prefix.group("me") and prefix.group("prefix").lower().startswith("напом"):
+        first_word = rest.split(" ", 1)[0] if rest else ""
+        if first_word[:1].isupper() and first_word.lower().endswith(("у", "ю", "е", "и")):
+            confidence = 0.6
+
+    repeat_interval = "NULL"
+    repeat = _REPEAT.search(rest)
+    if repeat:
+        repeat_interval = "daily" if repeat.group("daily") else "weekly"
+        rest = rest[:repeat.start()] + rest[repeat.end():]
+
+    start_time = None
+    relative = _RELATIVE_TIME.search(rest)
+    if relative:
+        amount = int(relative.group("amount") or 1)
+        unit = relative.group("unit").lower()
+        if unit == "полчаса":
+            delta = timedelta(minutes=30)
+        elif unit.startswith(("мин", "min")):
+            delta = timedelta(minutes=amount)
+        elif unit.startswith(("час", "hour")):
+            delta = timedelta(hours=amount)
+        else:
+            delta = timedelta(days=amount)
+        start_time = (current_datetime + delta).replace(second=0, microsecond=0)
+        rest = rest[:relative.start()] + rest[relative.end():]
+    else:
+        absolute = _ABSOLUTE_TIME.search(rest)
+        if absolute:
+            hour = int(absolute.group("hour"))
+            minute = int(absolute.group("minute") or 0)
+            suffix = (absolute.group("suffix") or "").lower()
+            if suffix in ("pm", "вечера", "дня") and hour < 12:
+                hour += 12
+            elif suffix in ("am", "ночи", "утра") and hour == 12:
+                hour = 0
+            if hour > 23 or minute > 59:
+                return None
+            # "в 10" без минут и уточнений может оказаться не временем
+            if not absolute.group("minute") and not suffix and not absolute.group("hours_word"):
+                confidence = min(confidence, 0.8)
+            rest = rest[:absolute.start()] + rest[absolute.end():]
+
+            day = _DAY_WORD.search(rest)
+            if day:
+                day_offset = _DAY_OFFSETS[day.group("day").lower()]
+                rest = rest[:day.start()] + rest[day.end():]
+            else:
+                day_offset = 0
+            start_time = (current_datetime + timedelta(days=day_offset)).replace(
+                hour=hour, minute=minute, second=0, microsecond=0
+            )
+            # Время сегодня уже прошло, а день не указан - переносим на завтра
+            if not day and start_time <= current_datetime:
+                start_time += timedelta(days=1)
+
+    if start_time is None:
+        return None
+
+    task_text = " ".join(rest.replace(" ,", ",").split()).strip(" ,.-")
+    task_text = _TASK_CONNECTOR.sub("", task_text)
+    if len(task_text) < 2 or _UNPARSED_TIME.search(task_text):
+        return None
+    # Длинные формулировки часто содержат уточнения, которые лучше разберёт LLM
+    if len(task_text.split()) > 12:
+        confidence = min(confidence, 0.8)
+
+    return {
+        "task_details": {
+            "task_text": task_text[0].upper() + task_text[1:],
+            "start_time": start_time,
+            "repeat_interval": repeat_interval,
+        },
+        "confidence": confidence,
+    }
+
+
 # Извлечение из сообщение планировщика основных компонентов для БД
 async def classify_and_extract_task_details(current_datetime: datetime, message_text: str):
-    tools = [
-        {
-            "type": "function",
-            "function": {
-                "name": "classify_text",
-                "description": "Classify and extract task details for scheduling. ",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "task_text": {
-                            "type": "string", 
-                            "description": f"""
-                                Paraphrase the task description, converting it into a neutral and appropriate form, ensuring that:
-                                - The task text MUST does not include any reference to the EXECUTION DATE or TIME INTERVAL.
-                                - The resulting text MUST BE is concise, focusing solely on the essence of the task.
-
-                                For example:
-                                - Original: "Make an appointment with Oleg for tomorrow." → Result: "Meeting with Oleg.".
-                                - Original: "Call the client at 3 pm." → Result: "Call to client.".
-
-                                !!! If task_text is NOT defined in "{message_text}", return only False !!!
-                            """
-                        },
-                        "start_time": {
-                            "type": "string",
-                            "description": f"""
-                                The start time of the task in ISO 8601 format (e.g., 2024-12-01 14:00:00). 
-                                !!! If start_time NOT defined in "{message_text}", return only False !!!
-                            """
-                        },
-                        "repeat_interval": {
-                            "type": "string",
-                            "description": "The repeat interval of the task (e.g., 'daily', 'weekly', or 'NULL' for no repetition)."
-                        },
-                    },
-                    "required": ["task_text", "start_time", "repeat_interval"],
-                    "additionalProperties": False,
-                },
-            }
-        }
-    ]
-
-    # Формируем промпт
-    prompt = (
-        f"""
-            Current datetime is: {current_datetime.isoformat()}.\n"
-            Process the following scheduling request: '{message_text}'.\n"
-            Return the task details in this format: task_text, start_time (ISO 8601), and repeat_interval ('daily', 'weekly', or 'NULL').
-            If task_text or start_time or both of them NOT defined in "{message_text}", return instead of him (them) only False
-        """
-    )
-
     try:
         # Создаём асинхронный запрос к OpenAI
-        completion = await client.chat.completions.create(
-            model="gpt-4o-mini",
+        completion = await llm_client.create_chat_completion(
+            call_name="classify_and_extract_task_details",
+            model=llm_client.EXTRACTOR_MODEL,
             messages=[
-                {"role": "system", "content": "You are a scheduling assistant."},
-                {"role": "user", "content": prompt}
+                {"role": "system", "content": TASK_DETAILS_INSTRUCTIONS},
+                {"role": "user", "content": f"Current datetime is: {current_datetime.isoformat()}.\nScheduling request: {message_text}"}
             ],
-            tools=tools,
+            tools=TASK_DETAILS_TOOLS,
         )
 
         # Обрабатываем результат
         result = json.loads(completion.choices[0].message.tool_calls[0].function.arguments)
 
-        # Проверяем каждое поле и обрабатываем отсутствующие данные
-        task_text = result.get("task_text", None)
-        start_time_raw = result.get("start_time", None)
-        repeat_interval = result.get("repeat_interval", None)
-
-        # Если данных нет, устанавливаем значение False
-        if not task_text:
-            task_text = False
-            
-        # print(current_datetime, "\n", start_time_raw)
-
-        if datetime.fromisoformat(start_time_raw) == current_datetime:
-            start_time_raw = False
-        else:
-            try:
-                start_time_raw = datetime.fromisoformat(start_time_raw)
-            except ValueError:
-                start_time_raw = False
-
-        # Устанавливаем значение 'NULL' по умолчанию, если repeat_interval отсутствует
-        if not repeat_interval:
-            repeat_interval = 'NULL'
-
         # Формируем и возвращаем результат
-        return {
-            "task_text": task_text,
-            "start_time": start_time_raw,
-            "repeat_interval": repeat_interval,
-        }
+        return parse_task_details(result, current_datetime)
 
     except (KeyError, ValueError, TypeError) as e:
         return f"Ошибка при анализе результата: {e}"
@@ -128,13 +288,15 @@ async def classify_and_extract_task_details(current_datetime: datetime, message_
       
 
 # Добавление задачи в бд
-async def process_user_task(user_id: str, message_text: str, tg_message: Message):
+async def process_user_task(user_id: str, message_text: str, tg_message: Message, task_details: dict | None = None):
     """
     Обрабатывает сообщение пользователя, классифицирует задачу и добавляет её в планировщик.
 
     Args:
         user_id (str): Идентификатор пользователя.
         message_text (str): Сообщение пользователя, описывающее задачу.
+        task_details (dict | None): Уже извлечённые детали задачи (например, из совмещённой маршрутизации).
+            Если не переданы, детали извлекаются отдельным запросом к OpenAI.
 
     Returns:
         dict: Результат добавления задачи или сообщение об ошибке.
@@ -144,8 +306,9 @@ async def process_user_task(user_id: str, message_text: str, tg_message: Message
         current_datetime = datetime.now()
         chat_id = tg_message.from_user.id
 
-        # Классифицируем и извлекаем детали задачи
-        task_details = await classify_and_extract_task_details(current_datetime, message_text)
+        # Классифицируем и извлекаем детали задачи, если они не были получены при маршрутизации
+        if task_details is None:
+            task_details = await classify_and_extract_task_details(current_datetime, message_text)
 
         # Проверяем, получены ли корректные данные
         task_text = task_details.get("task_text")
@@ -156,7 +319,7 @@ async def process_user_task(user_id: str, message_text: str, tg_message: Message
         if not task_text:
             text = "Не удалось извлечь текст задачи из вашего сообщения. Пожалуйста уточните задание!"
             await tg_message.answer(text=text)
-            await speak_text_gtts_and_send(chat_id=chat_id, text=text)
+            speak_in_background(chat_id=chat_id, text=text)
             return {
                 "status": "error",
                 "message": "Не удалось извлечь текст задачи из вашего сообщения. Пожалуйста уточните задание!"
@@ -164,7 +327,7 @@ async def process_user_task(user_id: str, message_text: str, tg_message: Message
         elif not start_time:
             text = "Не удалось извлечь время начала выполения задчи из вашего сообщения. Пожалуйста уточните задание!"
             await tg_message.answer(text=text)
-            await speak_text_gtts_and_send(chat_id=chat_id, text=text)
+            speak_in_background(chat_id=chat_id, text=text)
             return {
                 "status": "error",
                 "message": "Не удалось извлечь время начала выполения задчи из вашего сообщения. Пожалуйста уточните задание!"
@@ -172,7 +335,7 @@ async def process_user_task(user_id: str, message_text: str, tg_message: Message
         elif not task_text and not start_time:
             text = "Не удалось извлечь текст задачи или время начала выполнения задания из вышего сообщения. Пожалуйста уточните задание!!"
             await tg_message.answer(text=text)
-            await speak_text_gtts_and_send(chat_id=chat_id, text=text)
+            speak_in_background(chat_id=chat_id, text=text)
             return {
                 "status": "error",
                 "message": "Не удалось извлечь текст задачи или время начала выполнения задания из вышего сообщения. Пожалуйста уточните задание!"
@@ -197,7 +360,7 @@ async def process_user_task(user_id: str, message_text: str, tg_message: Message
         
         text = "Задача успешно добавлена в планировщик. С чем вам я могу еще помочь?!"
         await tg_message.answer(text=text)
-        await speak_text_gtts_and_send(chat_id=chat_id, text=text)
+        speak_in_background(chat_id=chat_id, text=text)
         return {
             "status": "success",
             "message": "Задача успешно добавлена в планировщик.",
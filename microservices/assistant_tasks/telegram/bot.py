@@ -6,10 +6,54 @@ import time
 from telethon.tl.types import Channel
 
 import api_gateway.utils as gateway_utils
+from functions.rate_limiter import Priority
 
 import functions.config as config
 
 
+# Имена известных чатов (по результатам последних запросов списка диалогов):
+# нормализованное имя -> имя чата. Используются быстрым парсером команд, чтобы
+# не принимать за адресата произвольное слово из команды
+known_chats: dict[str, str] = {}
+known_private_chats: dict[str, str] = {}
+
+
+def normalize_chat_name(name: str) -> str:
+    """
+    Приводит имя чата к виду для точного сравнения (регистр, "ё", лишние пробелы).
+    """
+    return " ".join(name.lower().replace("ё", "е").split())
+
+
+def _remember_chats(registry: dict, chats: list):
+    """
+    Обновляет словарь известных имён чатов по свежему списку диалогов.
+    """
+    registry.clear()
+    for chat in chats:
+        if chat["name"]:
+            registry[normalize_chat_name(chat["name"])] = chat["name"]
+
+
+async def load_known_chats():
+    """
+    Загружает имена чатов для быстрого парсера команд (вызывается при запуске приложения),
+    чтобы команды распознавались без LLM с первого сообщения.
+    """
+    try:
+        async with config.telegram_client:
+            dialogs = await config.telegram_client.get_dialogs()
+            _remember_chats(known_chats, [{"id": dialog.id, "name": dialog.name} for dialog in dialogs])
+            _remember_chats(known_private_chats, [
+                {"id": dialog.id, "name": dialog.name}
+                for dialog in dialogs
+                if dialog.is_user and not dialog.entity.bot
+            ])
+        print(f"Загружено имён чатов для быстрого разбора команд: {len(known_chats)}")
+    except Exception as e:
+        print(f"Не удалось загрузить список чатов Telegram: {e}")
+
+
 async def get_all_chats():
     """
     Получить список всех чатов.
@@ -21,6 +65,7 @@ async def get_all_chats():
             for dialog in dialogs
         ]
         print(all_chats)
+        _remember_chats(known_chats, all_chats)
         return all_chats
     
 async def get_private_chats():
@@ -52,6 +97,7 @@ async def get_private_chats_withoiut_bot():
         # for chat in private_chats:
         #     print(f"Имя: {chat['name']}, ID: {chat['id']}")
         
+        _remember_chats(known_private_chats, private_chats)
         return private_chats
 
 async def get_channels():
@@ -148,7 +194,8 @@ async def find_chat(dialogs, recipient):
     primary_labels = [item[0] for item in results]  # Извлекаем совпавшие имена
 
     start_time_gpt = time.perf_counter()
-    result = await gateway_utils.classify_text_async(sequence_to_classify=sequence_to_classify, candidate_labels=primary_labels)
+    # Выбор чата - фоновая работа, она не должна вытеснять ответы на сообщения пользователей
+    result = await gateway_utils.classify_text_async(sequence_to_classify=sequence_to_classify, candidate_labels=primary_labels, priority=Priority.BACKGROUND)
     end_time_gpt = time.perf_counter()
     execution_time_gpt = end_time_gpt - start_time_gpt
     print(f"Время выполнения classify_text_async: {execution_time_gpt:.6f} секунд")
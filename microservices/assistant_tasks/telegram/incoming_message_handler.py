@@ -10,7 +10,7 @@ from functions.config import bot_tg, dp
 from functions.redis_client import set_user_state
 
 # Импорт отправки сообщения в голосе
-from functions.ftt_utils import speak_text_gtts_and_send
+from functions.tts_queue import speak_in_background
 
 # # Настройки для озвучивания текста
 # engine = pyttsx3.init()
@@ -54,7 +54,7 @@ async def handle_message(event):
             chat_id=chat_id,  # chat_id = user_id
             text=text
         )
-        await speak_text_gtts_and_send(chat_id=chat_id, text=text)
+        speak_in_background(chat_id=chat_id, text=text)
         print("Сообщение успешно отправлено")
     except Exception as e:
         print(f"Ошибка отправки сообщения: {e}")
@@ -1,4 +1,5 @@
 from datetime import datetime, timedelta
+import re
 
 from aiogram.types import Message
 
@@ -7,32 +8,194 @@ import microservices.assistant_tasks.telegram.classification as classification
 import microservices.assistant_tasks.telegram.bot as telegram_bot
 
 # Импорт отправки сообщения в голосе
-from functions.ftt_utils import speak_text_gtts_and_send
+from functions.tts_queue import speak_in_background
+
+
+# Шаблоны команд отправки сообщения: "напиши маме: скоро буду", "send to John: hello"
+_SEND_PATTERNS = [
+    (re.compile(r"^(?:напиши|отправь|передай|скажи)\s+(?:сообщение\s+)?(?P<chat>[^:]+?)\s*:\s*(?P<message>.+)$", re.IGNORECASE | re.DOTALL), 0.95),
+    (re.compile(r"^(?:write|send|tell|text|message)\s+(?:a\s+message\s+)?(?:to\s+)?(?P<chat>[^:]+?)\s*:\s*(?P<message>.+)$", re.IGNORECASE | re.DOTALL), 0.95),
+]
+
+# Шаблоны команд чтения сообщений: "что писал Олег", "прочитай последние 3 сообщения от Ивана"
+_READ_PATTERNS = [
+    (re.compile(r"^что\s+(?:мне\s+)?(?:писал[аи]?|написал[аи]?|пишет|пишут)\s+(?:мне\s+)?(?P<chat>.+?)$", re.IGNORECASE), 0.9),
+    (re.compile(r"^(?:прочитай|прочти|покажи|зачитай)\s+(?:мне\s+)?(?:последн\w+\s+)?(?:(?P<count>\d+)\s+)?(?P<noun>сообщени\w*)\s+(?:от|из|в|с)\s+(?:чата\s+|группы\s+|канала\s+)?(?P<chat>.+?)$", re.IGNORECASE), 0.9),
+    (re.compile(r"^(?:read|show)\s+(?:me\s+)?(?:the\s+)?(?:last\s+)?(?:(?P<count>\d+)\s+)?(?P<noun>messages?)\s+(?:from|in)\s+(?:the\s+)?(?P<chat>.+?)(?:\s+chat)?$", re.IGNORECASE), 0.9),
+    (re.compile(r"^what\s+did\s+(?P<chat>.+?)\s+(?:write|say|send)(?:\s+me)?$", re.IGNORECASE), 0.85),
+]
+
+# Указание языка сообщения требует перевода, его выполняет только LLM
+_LANGUAGE_HINT = re.compile(r"\b(?:на\s+\w+ком(?:\s+языке)?|in\s+(?:english|german|french|spanish|chinese|russian))\s*$", re.IGNORECASE)
+
+
+# Местоимения не бывают адресатами: "скажи мне: ...", "tell me: ..." - это вопрос к ассистенту
+_PRONOUNS = {
+    "мне", "меня", "мной", "нам", "нас", "себе", "тебе", "вам", "ему", "ей", "им", "всем",
+    "me", "us", "myself", "you", "him", "her", "them", "everyone",
+}
+
+# Творческие задания: "напиши стих: про осень" - это просьба к ассистенту, а не отправка сообщения
+_CREATIVE_OBJECTS = {
+    "стих", "стихи", "стихотворение", "стишок", "песню", "песня", "рассказ", "историю", "сказку",
+    "сочинение", "эссе", "статью", "текст", "пост", "письмо", "поздравление", "шутку", "анекдот",
+    "код", "план", "список", "резюме", "отзыв", "описание", "тост",
+    "poem", "song", "story", "essay", "article", "text", "post", "letter", "joke", "code",
+    "plan", "list", "summary", "review", "description", "toast",
+}
+
+# Окончания косвенных падежей и соответствующие окончания именительного падежа:
+# "маме" -> "мама", "Ивана" -> "Иван", "Андрею" -> "Андрей", "Марии" -> "Мария"
+_CASE_ENDINGS = [
+    ("ии", ("ия",)),
+    ("ой", ("а", "я")),
+    ("ей", ("я", "ь")),
+    ("ом", ("",)),
+    ("ем", ("й", "ь")),
+    ("е", ("а", "я")),
+    ("у", ("", "а")),
+    ("ю", ("я", "й", "ь")),
+    ("а", ("",)),
+    ("я", ("й", "ь")),
+    ("и", ("а", "я", "ь")),
+    ("ы", ("а",)),
+]
+
+# Максимальное число слов в имени адресата
+_MAX_CHAT_NAME_WORDS = 4
+
+
+def _nominative_forms(word: str) -> set[str]:
+    """
+    Возможные формы слова в именительном падеже (само слово и замены падежных окончаний).
+    """
+    forms = {word}
+    for ending, replacements in _CASE_ENDINGS:
+        if word.endswith(ending) and len(word) > len(ending) + 1:
+            stem = word[:-len(ending)]
+            forms.update(stem + replacement for replacement in replacements)
+    return forms
+
+
+def _resolve_chat_name(chat_name: str, known_names: dict[str, str]) -> str | None:
+    """
+    Находит среди известных чатов тот, чьё имя точно совпадает с адресатом из команды
+    после приведения адресата к именительному падежу.
+
+    Args:
+        chat_name (str): Адресат из команды ("маме", "Ивана Петрова").
+        known_names (dict): Нормализованное имя -> имя чата (см. telegram_bot.known_chats).
+
+    Returns:
+        str | None: Имя чата или None, если адресат не является известным чатом.
+    """
+    words = telegram_bot.normalize_chat_name(chat_name).split()
+    if not words or len(words) > _MAX_CHAT_NAME_WORDS:
+        return None
+    if _PRONOUNS.intersection(words) or words[0] in _CREATIVE_OBJECTS:
+        return None
+
+    candidates = [""]
+    for word in words:
+        candidates = [f"{prefix} {form}".strip() for prefix in candidates for form in _nominative_forms(word)]
+    for candidate in candidates:
+        if candidate in known_names:
+            return known_names[candidate]
+    return None
 
 
 def parse_command(command):
     """
-    Простейший парсер для обработки текстовых команд.
+    Детерминированный парсер частых команд менеджера Telegram (русский и английский).
+
+    Распознаёт отправку сообщения ("напиши маме: скоро буду", "send to John: hi")
+    и чтение последних сообщений ("что писал Олег", "прочитай последние 3 сообщения от Ивана").
+
+    Команда распознаётся, только если адресат точно совпадает с именем известного чата
+    (после приведения к именительному падежу); иначе разбор остаётся за LLM.
+
+    Args:
+        command (str): Текст сообщения пользователя.
+
+    Returns:
+        dict: {"action": ..., "params": {...}, "confidence": float}; action равен "unknown",
+            если команда не распознана.
+    """
+    text = " ".join(command.strip().split()).rstrip(".!?")
+
+    for pattern, confidence in _SEND_PATTERNS:
+        match = pattern.match(text)
+        if match:
+            chat_name = _resolve_chat_name(match.group("chat").strip(" ,"), telegram_bot.known_private_chats)
+            message = match.group("message").strip()
+            if not message or chat_name is None:
+                break
+            if _LANGUAGE_HINT.search(message):
+                confidence *= 0.5
+            return {
+                "action": "send_message",
+                "params": {"chat_name": chat_name, "message": message},
+                "confidence": confidence,
+            }
+
+    for pattern, confidence in _READ_PATTERNS:
+        match = pattern.match(text)
+        if match:
+            chat_name = _resolve_chat_name(match.group("chat").strip(" ,"), telegram_bot.known_chats)
+            if chat_name is None:
+                break
+            groups = match.groupdict()
+            if groups.get("count"):
+                limit = int(groups["count"])
+            elif groups.get("noun") and groups["noun"].lower() in ("сообщение", "message"):
+                limit = 1
+            else:
+                limit = 5
+            return {
+                "action": "read_last_messages",
+                "params": {"chat_name": chat_name, "limit": limit},
+                "confidence": confidence,
+            }
+
+    return {"action": "unknown", "params": {}, "confidence": 0.0}
+
+
+def command_to_task_details(parsed_command: dict) -> dict | None:
     """
-    if "напиши" in command:
-        parts = command.split(":")
-        chat_name = parts[0].replace("напиши", "").strip()
-        message = parts[1].strip()
-        return {"action": "send_message", "params": {"chat_name": chat_name, "message": message}}
+    Преобразует результат parse_command в task_details, которые принимает process_tg_manager.
 
-    if "что писал" in command:
-        chat_name = command.replace("что писал", "").strip()
-        return {"action": "read_last_messages", "params": {"chat_name": chat_name, "limit": 5}}
+    Args:
+        parsed_command (dict): Результат parse_command.
 
-    return {"action": "unknown", "params": {}}
+    Returns:
+        dict | None: action_type, recipient, read_count и message_content или None для неизвестной команды.
+    """
+    params = parsed_command.get("params", {})
+    if parsed_command.get("action") == "send_message":
+        return {
+            "action_type": "send",
+            "recipient": params["chat_name"],
+            "read_count": None,
+            "message_content": params["message"],
+        }
+    if parsed_command.get("action") == "read_last_messages":
+        return {
+            "action_type": "read",
+            "recipient": params["chat_name"],
+            "read_count": params["limit"],
+            "message_content": None,
+        }
+    return None
 
-async def process_tg_manager(user_id: str, message_text: str, tg_message: Message):
+async def process_tg_manager(user_id: str, message_text: str, tg_message: Message, task_details: dict | None = None):
     """
     Обрабатывает сообщение пользователя, классифицирует задачу и добавляет её в планировщик.
 
     Args:
         user_id (str): Идентификатор пользователя.
         message_text (str): Сообщение пользователя, описывающее задачу.
+        task_details (dict | None): Уже извлечённые параметры действия (например, из совмещённой маршрутизации).
+            Если не переданы, параметры извлекаются отдельным запросом к OpenAI.
 
     Returns:
         dict: Результат добавления задачи или сообщение об ошибке.
@@ -43,10 +206,11 @@ async def process_tg_manager(user_id: str, message_text: str, tg_message: Messag
         chat_id = tg_message.from_user.id
 
         try:
-            # Классифицируем и извлекаем детали задачи
-            task_details = await classification.classify_and_filter_message_action(
-                current_datetime=current_datetime, message_text=message_text
-            )
+            # Классифицируем и извлекаем детали задачи, если они не были получены при маршрутизации
+            if task_details is None:
+                task_details = await classification.classify_and_filter_message_action(
+                    current_datetime=current_datetime, message_text=message_text
+                )
         except AttributeError as ae:
             return {
                 "status": "error",
@@ -91,7 +255,7 @@ async def process_tg_manager(user_id: str, message_text: str, tg_message: Messag
             missing_fields_text = ", ".join(missing_fields)
             text = f"Не удалось извлечь следующие данные из вашего сообщения: {missing_fields_text}. \nПожалуйста, уточните ваше задание!"
             await tg_message.answer(text=text)
-            await speak_text_gtts_and_send(chat_id=chat_id, text=text)
+            speak_in_background(chat_id=chat_id, text=text)
             
             return {
                 "status": "error",
@@ -138,11 +302,11 @@ async def process_tg_manager(user_id: str, message_text: str, tg_message: Messag
                 if sent_res:
                     text = f"Сообщение для {chat_inf['name']} отправлено успешно!"
                     await tg_message.answer(text=text)
-                    await speak_text_gtts_and_send(chat_id=chat_id, text=text)
+                    speak_in_background(chat_id=chat_id, text=text)
                 else:
                     text = f"Сообщение не отправлено, повторите попытку!"
                     await tg_message.answer(text=text)
-                    await speak_text_gtts_and_send(chat_id=chat_id, text=text)
+                    speak_in_background(chat_id=chat_id, text=text)
 
             elif action_type == "read":
                 print(f"\nЧитаем сообщение\n")
@@ -182,11 +346,11 @@ async def process_tg_manager(user_id: str, message_text: str, tg_message: Messag
                 if read_messages:
                     text = f"Последние {read_count} сообщение(я) из {chat_inf['name']} следующие: {read_messages}"
                     await tg_message.answer(text=text)
-                    await speak_text_gtts_and_send(chat_id=chat_id, text=text)
+                    speak_in_background(chat_id=chat_id, text=text)
                 else:
                     text = f"Сообщение не прочитано, повторите попытку!"
                     await tg_message.answer(text=text)
-                    await speak_text_gtts_and_send(chat_id=chat_id, text=text)
+                    speak_in_background(chat_id=chat_id, text=text)
 
             elif action_type == "delete":
                 print(f"\Удаляем сообщение\n")
@@ -211,7 +375,7 @@ async def process_tg_manager(user_id: str, message_text: str, tg_message: Messag
         # Если все необходимые данные получены, сообщаем об успехе
         text = "Задание менеджера telegram успешно выполнена. С чем я могу еще помочь?"
         await tg_message.answer(text=text)
-        await speak_text_gtts_and_send(chat_id=chat_id, text=text)
+        speak_in_background(chat_id=chat_id, text=text)
         return {
             "status": "success",
             "message": "Задача успешно добавлена в планировщик.",
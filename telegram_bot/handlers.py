@@ -37,20 +37,30 @@ async def handle_voice_message(message: Message, state: FSMContext):
         # Отправка сообщения в amplitude
         user_id = str(message.from_user.id)
         file_id = message.voice.file_id
-        
-        # Получение пути к файлу
-        try:
-            file_info = await bot_tg.get_file(file_id=file_id)
-            file_path = str(file_info.file_path)
-        except Exception as e:
-            logging.error(f"Ошибка при получении пути к файлу: {e}") 
-            
-        # Транскрибация файла
-        try:
-            transcription = await ftt_utils.process_voice_message(file_path=file_path)
-            await message.answer(transcription)
-        except Exception as e:
-            logging.error(f"Ошибка при получении пути к файлу: {e}") 
+        file_unique_id = message.voice.file_unique_id
+
+        # Повторно отправленное или пересланное сообщение уже распознавалось
+        transcription = await ftt_utils.get_cached_transcription(file_unique_id)
+
+        if transcription is None:
+            # Получение пути к файлу
+            try:
+                file_info = await bot_tg.get_file(file_id=file_id)
+                file_path = str(file_info.file_path)
+            except Exception as e:
+                logging.error(f"Ошибка при получении пути к файлу: {e}") 
+
+            # Транскрибация файла
+            try:
+                transcription = await ftt_utils.process_voice_message(
+                    file_path=file_path,
+                    duration=message.voice.duration,
+                    file_unique_id=file_unique_id,
+                )
+            except Exception as e:
+                logging.error(f"Ошибка при получении пути к файлу: {e}") 
+
+        await message.answer(transcription)
             
         # Отправка текста в фильтрации
         await gateway.handle_user_message(message=transcription, user_id=user_id, tg_message=message)